@@ -1,20 +1,35 @@
+import time
+
+RERUN_START = time.perf_counter()
+
 import streamlit as st
 import os
 import sys
-import base64
+import html
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from io import BytesIO
 
 # Add root directory to path (ensures imports work)
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-# Import modules from ingestion and rag
-from ingestion.extractor import parse_pdf_to_json
-from ingestion.chunker import json_to_documents
-from ingestion.arxiv_fetcher import download_latest_papers
-from rag.vector_store import create_or_load_vectorstore
-from rag.chain import build_rag_chain
+# Import modules from ingestion and rag. They pull in Chroma, LangChain,
+# Google GenAI, the PDF parsers and httpx, so they load on first use instead
+# of before the first render; benchmarks/import_time.py keeps it that way.
+from utils import metrics
+from utils.lazy import lazy_import, warm_up
 from dotenv import load_dotenv
 
+arxiv_fetcher = lazy_import("ingestion.arxiv_fetcher")
+ingest_jobs = lazy_import("ingestion.jobs")
+paper_previews = lazy_import("ingestion.preview")
+vector_store = lazy_import("rag.vector_store")
+rag_chain = lazy_import("rag.chain")
+rag_memory = lazy_import("rag.memory")
+rag_answer_cache = lazy_import("rag.answer_cache")
+rag_batch = lazy_import("rag.batch")
+
 load_dotenv()
 
 # --- Custom CSS for robust color themes, font, and centered title ---
@@ -209,11 +224,237 @@ css = f"""
 st.markdown(css, unsafe_allow_html=True)
 
 
+@st.cache_resource
+def start_warm_up():
+    # Once per process, after the first page is already on screen.
+    if os.getenv("APP_WARM_UP", "1") != "0":
+        return warm_up(
+            ingest_jobs, paper_previews, rag_chain, rag_memory, rag_answer_cache, rag_batch, arxiv_fetcher,
+            "langchain_community.vectorstores", "langchain_google_genai",
+        )
+
+
+@st.cache_resource
+def get_ingest_executor():
+    # Shared across reruns and sessions; ingestion jobs run here so a widget
+    # interaction never restarts them.
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="ingest")
+
+
+def ingest_job(paths, retry=False):
+    # Parsing and indexing start as soon as papers are selected and keep
+    # going in the background while the user types a question.
+    job = st.session_state.get("ingest_job")
+    if job is None or job.key != ingest_jobs.job_key(paths) or (retry and job.failed):
+        job = ingest_jobs.start_ingest(get_ingest_executor(), paths)
+        st.session_state.ingest_job = job
+    return job
+
+
+@st.fragment(run_every=0.5)
+def ingest_progress(job):
+    if job.ready or job.failed:
+        st.rerun()
+    if job.stage == "indexing":
+        text = f"Indexing {job.total} papers..."
+    else:
+        text = f"Parsed {job.parsed}/{job.total}" + (f": {os.path.basename(job.current)}" if job.current else "")
+    st.progress(job.parsed / max(job.total, 1), text=text)
+
+
+def read_pdf(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def save_upload(pdf_file, path):
+    # The uploader hands back the same files on every rerun, so a file is
+    # only written when a new upload (a new file_id) lands on its name and
+    # the bytes on disk differ; an unchanged file keeps its mtime and cache.
+    saved = st.session_state.saved_uploads
+    if saved.get(path) == pdf_file.file_id:
+        return
+    data = pdf_file.getbuffer()
+    if not os.path.exists(path) or os.path.getsize(path) != len(data) or read_pdf(path) != data:
+        with open(path, "wb") as f:
+            f.write(data)
+    saved[path] = pdf_file.file_id
+
+
+def answer_box(label, answer_persona):
+    persona_label = answer_persona.capitalize() if answer_persona != "default" else "Assistant"
+    answer_color = PERSONA_COLORS.get(answer_persona, "#e3f2fd")
+    placeholder = st.empty()
+
+    def render(text):
+        placeholder.markdown(f'<div class="persona-answer" style="background:{answer_color}; border:1.5px solid #bbb;"><b>{persona_label} {label}:</b><br>{text}</div>', unsafe_allow_html=True)
+
+    return render
+
+
+def chat_memory(job):
+    # One bounded conversation per session and set of papers, shared by both
+    # question boxes so the second can follow up on the first.
+    if st.session_state.get("chat_memory_job") != job.key:
+        st.session_state.chat_memory = rag_memory.get_chat_memory(rag_chain.get_llm())
+        st.session_state.chat_memory_job = job.key
+    return st.session_state.chat_memory
+
+
+def render_answer(vectordb, docs, question, label, memory):
+    render = answer_box(label, persona)
+
+    # Repeat (or near-duplicate) questions over the same chunks skip the LLM.
+    # Follow-ups are looked up by their standalone form, so "and its
+    # limitations?" after different questions is not the same question.
+    chunk_ids = [d.metadata["chunk_id"] for d in docs]
+    answer_cache = rag_answer_cache.get_answer_cache(vectordb.embeddings)
+    start = time.perf_counter()
+    standalone = memory.condense(question)
+    answer = answer_cache.get(persona, chunk_ids, standalone)
+    if answer is not None:
+        memory.add_turn(question, answer)
+        render(answer)
+        caption = f"Answered from cache in {(time.perf_counter() - start) * 1000:.0f} ms"
+        st.caption(caption)
+        return answer, caption
+
+    chain = rag_chain.build_rag_chain(vectordb, persona, search_filter=vector_store.scope_filter(docs))
+    stats = {}
+    answer = ""
+    for piece in rag_chain.stream_answer(chain, question, stats, memory):
+        answer += piece
+        render(answer + "▌")
+    render(answer)
+    answer_cache.put(persona, chunk_ids, standalone, answer)
+    caption = (
+        f"First token after {stats['ttft']:.2f}s · full answer in {stats['total']:.2f}s"
+        f" · prompt {stats.get('input_tokens') or stats.get('prompt_tokens', 0)} tokens"
+    )
+    st.caption(caption)
+    return answer, caption
+
+
+def batch_panel(job):
+    # Many questions over the selected papers: indexed once, retrieved in one
+    # pass and generated with bounded concurrency. Results stay in session
+    # state so the download buttons' reruns keep them on screen.
+    questions = st.session_state.get("pending_batch")
+    if questions and job.failed:
+        del st.session_state.pending_batch
+        st.error(f"Processing the selected papers failed: {job.error}")
+    elif questions and not job.ready:
+        ingest_progress(job)
+    elif questions:
+        del st.session_state.pending_batch
+        docs = [d for section in job.section_docs for d in section]
+        start = time.perf_counter()
+        with st.spinner(f"Answering {len(questions)} questions..."):
+            rows = rag_batch.answer_questions(
+                job.vectordb, questions, persona, search_filter=vector_store.scope_filter(docs), llm=rag_chain.get_llm()
+            )
+        st.session_state.batch_results = {
+            "job": job.key, "rows": rows, "summary": rag_batch.format_summary(rows, time.perf_counter() - start)
+        }
+    results = st.session_state.get("batch_results")
+    if not results or results["job"] != job.key:
+        return
+    rows = results["rows"]
+    st.caption(results["summary"])
+    st.dataframe(
+        [{k: row[k] for k in ("question", "answer", "latency_ms", "error")} for row in rows],
+        use_container_width=True,
+    )
+    st.download_button("⬇️ Results (CSV)", data=partial(rag_batch.to_csv, rows), file_name="answers.csv",
+                       mime="text/csv", on_click="ignore")
+    st.download_button("⬇️ Results (JSONL)", data=partial(rag_batch.to_jsonl, rows), file_name="answers.jsonl",
+                       mime="application/jsonl", on_click="ignore")
+
+
+def debug_panel():
+    # Where the time of recent questions and ingests went. Collection is
+    # process-wide, so switching it on here covers every session.
+    enabled = st.sidebar.toggle("Collect timings", value=metrics.ENABLED, key="metrics_enabled")
+    metrics.enable(enabled)
+    if not enabled:
+        return
+    with st.sidebar.expander("Timings", expanded=True):
+        snapshot = metrics.snapshot()
+        for trace in snapshot["traces"][:5]:
+            st.code("\n".join(metrics.format_trace(trace)), language=None)
+        histograms = snapshot["histograms"]
+        if histograms:
+            names = sorted(histograms, key=lambda name: -histograms[name]["sum"])
+            st.table({
+                "span": names,
+                "count": [histograms[n]["count"] for n in names],
+                "mean ms": [f"{histograms[n]['mean'] * 1000:.1f}" for n in names],
+                "p95 ms": [f"{histograms[n]['p95'] * 1000:.0f}" for n in names],
+                "max ms": [f"{histograms[n]['max'] * 1000:.1f}" for n in names],
+            })
+        if snapshot["counters"]:
+            st.table({"counter": list(snapshot["counters"]), "value": list(snapshot["counters"].values())})
+        # Built only when clicked.
+        st.download_button("Prometheus text", data=metrics.prometheus_text, file_name="paperbot_metrics.prom",
+                           mime="text/plain", on_click="ignore")
+        st.download_button("JSON", data=metrics.to_json, file_name="paperbot_metrics.json",
+                           mime="application/json", on_click="ignore")
+        if st.button("Reset timings"):
+            metrics.reset()
+            st.rerun()
+
+
+def qa_panel(job, question, label, multiselect_label, key, suffix=""):
+    st.info(f"Extraction methods used: {', '.join(job.extraction_methods)}")
+    for path, error in job.errors.items():
+        st.warning(f"Could not parse {os.path.basename(path)}: {error}")
+    all_sections = job.sections
+    if not all_sections or all(len(s["content"].strip()) <= 30 for s in all_sections):
+        st.error("No extractable text found in the selected PDFs. Try other files or methods.")
+        return
+    # Section selection with index (no hover preview)
+    section_titles = [f"{i+1}. {s['section_title']} ({len(s['content'])} chars) [{s['source']}]" for i, s in enumerate(all_sections)]
+    # For the multiselect, use the indexed section_titles as options
+    selected_sections = set(st.multiselect(
+        multiselect_label,
+        options=section_titles,
+        default=section_titles,
+        key=f"{key}-{hash(job.key)}"
+    ))
+    selected = [i for i, (s, t) in enumerate(zip(all_sections, section_titles)) if t in selected_sections and len(s["content"].strip()) > 30]
+    if not selected:
+        st.warning(f"No sections selected or all are too short{suffix}.")
+        return
+    docs = [d for i in selected for d in job.section_docs[i]]
+
+    # The answer is kept in session state, so the rerun triggered by the
+    # multiselect shows it again instead of losing it; changing the section
+    # selection re-asks the question over the new scope.
+    answers = st.session_state.setdefault("answers", {})
+    scope = tuple(d.metadata["chunk_id"] for d in docs)
+    stored = answers.get(label)
+    if stored and stored["job"] != job.key:
+        # Answers about papers that are no longer selected are not shown again.
+        del answers[label]
+        stored = None
+    if st.session_state.pending_questions.pop(label, False) or (stored and stored["scope"] != scope):
+        with metrics.span("question", label=label, persona=persona):
+            answer, caption = render_answer(job.vectordb, docs, question, label, chat_memory(job))
+        answers[label] = {"job": job.key, "persona": persona, "scope": scope, "answer": answer, "caption": caption}
+    elif stored:
+        answer_box(label, stored["persona"])(stored["answer"])
+        st.caption(stored["caption"])
+
+
 # Initialize session state for selected_paths
 if "selected_paths" not in st.session_state:
     st.session_state.selected_paths = []
 if "arxiv_mode" not in st.session_state:
     st.session_state.arxiv_mode = False
+if "pending_questions" not in st.session_state:
+    st.session_state.pending_questions = {}
+if "saved_uploads" not in st.session_state:
+    st.session_state.saved_uploads = {}
 
 # --- Main layout header: 1 and 2 side by side ---
 st.markdown(
@@ -238,8 +479,7 @@ with col1:
             paths = []
             for pdf_file in pdf_files[:num_pdfs]:
                 temp_path = os.path.join("data/papers", pdf_file.name)
-                with open(temp_path, "wb") as f:
-                    f.write(pdf_file.read())
+                save_upload(pdf_file, temp_path)
                 paths.append(temp_path)
             st.session_state.selected_paths = paths
             st.success(f"Uploaded: {', '.join([os.path.basename(p) for p in paths])}")
@@ -248,7 +488,7 @@ with col1:
         query = st.text_input("Search topic:")
         num_arxiv = st.number_input("How many relevant papers to fetch?", min_value=1, max_value=10, value=1, step=1)
         if st.button("Fetch from ArXiv"):
-            paths = download_latest_papers(query, max_results=num_arxiv)
+            paths = arxiv_fetcher.download_latest_papers(query, max_results=num_arxiv)
             if paths:
                 st.session_state.selected_paths = paths
                 st.success(f"Downloaded: {', '.join([os.path.basename(p) for p in paths])}")
@@ -257,17 +497,23 @@ with col1:
     # Show summary table of selected papers and download buttons for ArXiv
     selected_paths = st.session_state.selected_paths
     if selected_paths:
+        ingest_job(selected_paths)
         st.markdown("#### Selected Papers")
         paper_names = [os.path.basename(p) for p in selected_paths]
         # 1-based indexing for file numbering
         numbered_names = [f"{i+1}. {name}" for i, name in enumerate(paper_names)]
         if st.session_state.arxiv_mode:
-            for p, name in zip(selected_paths, numbered_names):
-                with open(p, "rb") as f:
-                    pdf_bytes = f.read()
-                b64 = base64.b64encode(pdf_bytes).decode()
-                href = f'<a href="data:application/pdf;base64,{b64}" download="{name}" class="pdf-download">⬇️ Download {name}</a>'
-                st.markdown(href, unsafe_allow_html=True)
+            # The file is only read when its button is clicked, and is served
+            # as a separate download rather than inlined into the page.
+            for i, (p, name) in enumerate(zip(selected_paths, numbered_names)):
+                st.download_button(
+                    f"⬇️ Download {name}",
+                    data=partial(read_pdf, p),
+                    file_name=os.path.basename(p),
+                    mime="application/pdf",
+                    key=f"download_{i}",
+                    on_click="ignore",
+                )
         st.table({"File Name": numbered_names})
 
         # --- PDF preview with slider and neutral color box ---
@@ -285,13 +531,18 @@ with col1:
 
         p = selected_paths[preview_index]
         name = numbered_names[preview_index]
-        try:
-            import pdfplumber
-            with pdfplumber.open(p) as pdf:
-                first_page = pdf.pages[0].extract_text() if pdf.pages else "(No pages)"
-            preview = first_page[:800] + ("..." if first_page and len(first_page) > 800 else "") if first_page else "(No extractable text)"
-        except Exception:
-            preview = "(Preview unavailable)"
+        # Cached by content hash at ingest time; nothing here opens the PDF.
+        info = paper_previews.get_preview(p)
+        preview = html.escape(info["text"])
+        details = " · ".join(
+            part for part in (
+                info.get("title"),
+                f"{info['num_pages']} pages" if info.get("num_pages") else None,
+                f"{info['size'] / 1e6:.1f} MB",
+            ) if part
+        )
+        if info.get("thumbnail") and os.path.exists(info["thumbnail"]):
+            st.image(info["thumbnail"], width=120)
         st.markdown(
             f"""
             <div style='
@@ -307,6 +558,7 @@ with col1:
                 box-shadow: 0 2px 8px rgba(0,0,0,0.04);
             '>
                 <b>{name}</b><br>
+                <small>{html.escape(details)}</small>
                 <pre style='white-space:pre-wrap; font-family: "Segoe UI", Arial, monospace; background: none; color: #333;'>{preview}</pre>
             </div>
             """,
@@ -336,52 +588,20 @@ with col2:
     run_qa1 = st.button("Run QA", key="run_qa_btn", help="Click to run QA on selected sections", type="primary")
     st.markdown("</div>", unsafe_allow_html=True)
 
-    # Output for first question
     if run_qa1 and st.session_state.selected_paths:
-        with st.spinner("Processing all selected papers..."):
-            all_sections = []
-            extraction_methods = set()
-            titles = []
-            for path in st.session_state.selected_paths:
-                paper_json = parse_pdf_to_json(path)
-                extraction_method = paper_json.get("extraction_method", "unknown")
-                extraction_methods.add(extraction_method)
-                sections = paper_json.get("sections", [])
-                title = paper_json.get("title", os.path.basename(path))
-                titles.append(title)
-                # Tag each section with its source
-                for s in sections:
-                    s["source"] = title
-                all_sections.extend(sections)
-            st.info(f"Extraction methods used: {', '.join(extraction_methods)}")
-            if not all_sections or all(len(s["content"].strip()) <= 30 for s in all_sections):
-                st.error("No extractable text found in the selected PDFs. Try other files or methods.")
-            else:
-                # Section selection with index (no hover preview)
-                section_titles = [f"{i+1}. {s['section_title']} ({len(s['content'])} chars) [{s['source']}]" for i, s in enumerate(all_sections)]
-                # For the multiselect, use the indexed section_titles as options
-                selected_sections = st.multiselect(
-                    "Choose sections:",
-                    options=section_titles,
-                    default=section_titles,
-                    key="section_multiselect"
-                )
-                selected_docs = [s for s, t in zip(all_sections, section_titles) if t in selected_sections and len(s["content"].strip()) > 30]
-                if not selected_docs:
-                    st.warning("No sections selected or all are too short.")
-                else:
-                    from langchain_core.documents import Document
-                    docs = [Document(
-                        page_content=s["content"],
-                        metadata={"section": s["section_title"], "source": s["source"]}
-                    ) for s in selected_docs]
-                    vectordb = create_or_load_vectorstore(docs)
-                    chain = build_rag_chain(vectordb, persona)
-                    response = chain.invoke(question1)
-                    persona_label = persona.capitalize() if persona != "default" else "Assistant"
-                    answer_color = PERSONA_COLORS.get(persona, "#e3f2fd")
-                    st.markdown(f'<div class="persona-answer" style="background:{answer_color}; border:1.5px solid #bbb;"><b>{persona_label} Answer:</b><br>{response.content}</div>', unsafe_allow_html=True)
-    
+        st.session_state.qa_active = True
+        st.session_state.pending_questions["Answer"] = True
+
+    # Output for first question
+    if st.session_state.get("qa_active") and st.session_state.selected_paths:
+        job = ingest_job(st.session_state.selected_paths, retry=run_qa1)
+        if job.failed:
+            st.error(f"Processing the selected papers failed: {job.error}")
+        elif not job.ready:
+            ingest_progress(job)
+        else:
+            qa_panel(job, question1, "Answer", "Choose sections:", "section_multiselect")
+
         # Now show the second question input and run button below the first answer
         st.markdown(
             """
@@ -394,49 +614,43 @@ with col2:
         st.markdown("</div>", unsafe_allow_html=True)
         run_qa2 = st.button("Run QA for Question 2", key="run_qa_btn2", help="Click to run QA on selected sections", type="primary")
         st.markdown("</div>", unsafe_allow_html=True)
+        if run_qa2:
+            st.session_state.pending_questions["Answer 2"] = True
 
         # Output for second question
-        if run_qa2:
-            with st.spinner("Processing all selected papers for second question..."):
-                all_sections = []
-                extraction_methods = set()
-                titles = []
-                for path in st.session_state.selected_paths:
-                    paper_json = parse_pdf_to_json(path)
-                    extraction_method = paper_json.get("extraction_method", "unknown")
-                    extraction_methods.add(extraction_method)
-                    sections = paper_json.get("sections", [])
-                    title = paper_json.get("title", os.path.basename(path))
-                    titles.append(title)
-                    # Tag each section with its source
-                    for s in sections:
-                        s["source"] = title
-                    all_sections.extend(sections)
-                st.info(f"Extraction methods used: {', '.join(extraction_methods)}")
-                if not all_sections or all(len(s["content"].strip()) <= 30 for s in all_sections):
-                    st.error("No extractable text found in the selected PDFs. Try other files or methods.")
-                else:
-                    # Section selection with index (no hover preview)
-                    section_titles = [f"{i+1}. {s['section_title']} ({len(s['content'])} chars) [{s['source']}]" for i, s in enumerate(all_sections)]
-                    # For the multiselect, use the indexed section_titles as options
-                    selected_sections = st.multiselect(
-                        "Choose sections for second question:",
-                        options=section_titles,
-                        default=section_titles,
-                        key="section_multiselect2"
+        if job.ready and ("Answer 2" in st.session_state.pending_questions or "Answer 2" in st.session_state.get("answers", {})):
+            qa_panel(job, question2, "Answer 2", "Choose sections for second question:", "section_multiselect2", " for the second question")
+
+    # --- Batch questions over the same papers ---
+    if st.session_state.selected_paths:
+        with st.expander("Batch questions"):
+            batch_text = st.text_area("One question per line:", key="batch_questions")
+            batch_file = st.file_uploader("Or upload a question list", type=["txt", "csv", "jsonl"], key="batch_file")
+            run_batch = st.button("Run batch", key="run_batch_btn", type="primary")
+            if run_batch:
+                if batch_file is not None:
+                    batch_questions = rag_batch.parse_questions(
+                        batch_file.getvalue().decode("utf-8"), os.path.splitext(batch_file.name)[1]
                     )
-                    selected_docs = [s for s, t in zip(all_sections, section_titles) if t in selected_sections and len(s["content"].strip()) > 30]
-                    if not selected_docs:
-                        st.warning("No sections selected or all are too short for the second question.")
-                    else:
-                        from langchain_core.documents import Document
-                        docs = [Document(
-                            page_content=s["content"],
-                            metadata={"section": s["section_title"], "source": s["source"]}
-                        ) for s in selected_docs]
-                        vectordb = create_or_load_vectorstore(docs)
-                        chain = build_rag_chain(vectordb, persona)
-                        response = chain.invoke(question2)
-                        persona_label = persona.capitalize() if persona != "default" else "Assistant"
-                        answer_color = PERSONA_COLORS.get(persona, "#e3f2fd")
-                        st.markdown(f'<div class="persona-answer" style="background:{answer_color}; border:1.5px solid #bbb;"><b>{persona_label} Answer 2:</b><br>{response.content}</div>', unsafe_allow_html=True)
+                else:
+                    batch_questions = rag_batch.parse_questions(batch_text)
+                if batch_questions:
+                    st.session_state.pending_batch = batch_questions
+                else:
+                    st.warning("Enter at least one question.")
+            batch_panel(ingest_job(st.session_state.selected_paths, retry=run_batch))
+
+# Rerun cost: Streamlit re-executes this whole script on every interaction.
+# The first run of a session is its time to first render.
+rerun_ms = (time.perf_counter() - RERUN_START) * 1000
+rerun_history = st.session_state.setdefault("rerun_ms", [])
+rerun_history.append(rerun_ms)
+del rerun_history[:-50]
+first_render_ms = st.session_state.setdefault("first_render_ms", rerun_ms)
+metrics.observe("app.rerun", rerun_ms / 1000)
+st.sidebar.caption(
+    f"First render {first_render_ms:.0f} ms · this rerun {rerun_ms:.0f} ms"
+    f" (median {statistics.median(rerun_history):.0f} ms over the last {len(rerun_history)})"
+)
+debug_panel()
+start_warm_up()
@@ -0,0 +1,67 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from ingestion.jobs import IngestJob
+from rag.batch import MAX_CONCURRENCY, answer_questions, format_summary, read_questions, write_results
+from rag.retrieval import RETRIEVAL_MODE
+from rag.vector_store import scope_filter
+
+
+def paper_paths(papers):
+    paths = []
+    for entry in papers:
+        if os.path.isdir(entry):
+            paths.extend(sorted(glob.glob(os.path.join(entry, "*.pdf"))))
+        else:
+            paths.append(entry)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a list of questions over a set of papers in one pass.")
+    parser.add_argument("questions", help="questions file: .txt (one per line), .csv (question column) or .jsonl")
+    parser.add_argument("papers", nargs="*", default=["data/papers"], help="PDFs or folders of PDFs")
+    parser.add_argument("--persona", choices=["default", "student", "professor"], default="default")
+    parser.add_argument("--output", default="answers.csv", help="results file (.jsonl for JSON lines, else CSV)")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="generation requests in flight")
+    parser.add_argument("--mode", choices=["hybrid", "dense", "lexical"], default=RETRIEVAL_MODE)
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    questions = read_questions(args.questions)
+    paths = paper_paths(args.papers)
+    if not questions or not paths:
+        print("Nothing to do: no questions or no PDFs found.")
+        return 1
+
+    start = time.perf_counter()
+    # Parsed and indexed once for every question.
+    job = IngestJob(paths)
+    job.run()
+    if job.failed or job.vectordb is None:
+        print(f"Could not index the papers: {job.error or 'no extractable text'}")
+        return 1
+    for path, error in job.errors.items():
+        print(f"Could not parse {os.path.basename(path)}: {error}")
+    docs = [d for section in job.section_docs for d in section]
+    print(f"Indexed {len(paths)} papers ({len(docs)} chunks) in {job.elapsed:.1f}s")
+
+    asked = time.perf_counter()
+    rows = answer_questions(
+        job.vectordb, questions, args.persona, search_filter=scope_filter(docs),
+        max_concurrency=args.concurrency, retrieval_mode=args.mode,
+    )
+    write_results(rows, args.output)
+    print(format_summary(rows, time.perf_counter() - asked))
+    print(f"Results written to {args.output}; done in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
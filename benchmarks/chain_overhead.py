@@ -0,0 +1,55 @@
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.documents import Document
+from rag import chain as rag_chain
+from rag.chain import build_rag_chain
+from rag.fakes import HashEmbeddings, fake_chat_model
+from rag.vector_store import create_or_load_vectorstore, scope_filter
+
+# Per-question overhead of build_rag_chain + invoke with no network: local
+# hash embeddings, a fake chat model, and a throwaway Chroma directory.
+
+QUESTIONS = 50
+
+
+def sample_documents(n=200):
+    return [
+        Document(
+            page_content=f"Section {i} discusses sample {i % 17} measured at {i * 3} K with method {i % 5}.",
+            metadata={"section": f"SECTION {i % 12}", "source": f"paper-{i % 10}.pdf"},
+        )
+        for i in range(n)
+    ]
+
+
+def run(memoized, vectordb, search_filter, llm):
+    timings = []
+    for i in range(QUESTIONS):
+        if not memoized:
+            rag_chain._chains.clear()
+        start = time.perf_counter()
+        chain = build_rag_chain(vectordb, "default", search_filter=search_filter, llm=llm)
+        chain.invoke(f"What was measured for sample {i % 17}?")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        embedding = HashEmbeddings()
+        docs = sample_documents()
+        vectordb = create_or_load_vectorstore(docs, persist_directory=tmp, embedding=embedding)
+        llm = fake_chat_model()
+        search_filter = scope_filter(docs)
+        for label, memoized in (("rebuilt per question", False), ("memoized", True)):
+            calls_before = embedding.calls
+            timings = run(memoized, vectordb, search_filter, llm)
+            print(f"{label:>21}: median {statistics.median(timings):6.2f} ms  "
+                  f"p95 {sorted(timings)[int(0.95 * (len(timings) - 1))]:6.2f} ms  "
+                  f"embedding calls/question {(embedding.calls - calls_before) / QUESTIONS:.1f}")
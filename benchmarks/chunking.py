@@ -0,0 +1,73 @@
+import glob
+import os
+import re
+import statistics
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from langchain_core.documents import Document
+from ingestion.chunker import estimate_tokens, json_to_documents
+from ingestion.extractor import parse_pdf_to_json
+
+# Compares how many context tokens a k=4 retrieval hands the LLM when every
+# section is one Document versus the token-sized chunks from json_to_documents.
+# Retrieval is approximated with term overlap so the run is offline and
+# deterministic.
+
+QUESTIONS = [
+    "What is the main contribution of this paper?",
+    "Summarize the method used in the experiments.",
+    "What are the key results and how were they measured?",
+    "What materials or samples were studied?",
+    "What limitations do the authors discuss?",
+    "How does this work compare to previous approaches?",
+]
+K = 4
+_TERM = re.compile(r"[a-z0-9]{3,}")
+
+
+def whole_section_documents(paper):
+    return [
+        Document(page_content=s["content"], metadata={"section": s["section_title"], "source": paper["title"]})
+        for s in paper["sections"] if len(s["content"].strip()) > 30
+    ]
+
+
+def top_k(docs, question, k=K):
+    terms = set(_TERM.findall(question.lower()))
+    scored = sorted(
+        docs,
+        key=lambda d: len(terms & set(_TERM.findall(d.page_content.lower()))) / (1 + len(d.page_content) ** 0.5),
+        reverse=True,
+    )
+    return scored[:k]
+
+
+def context_tokens(docs_by_paper):
+    per_question = []
+    for docs in docs_by_paper:
+        if not docs:
+            continue
+        for question in QUESTIONS:
+            per_question.append(sum(estimate_tokens(d.page_content) for d in top_k(docs, question)))
+    return per_question
+
+
+def report(name, docs_by_paper):
+    sizes = [estimate_tokens(d.page_content) for docs in docs_by_paper for d in docs]
+    ctx = context_tokens(docs_by_paper)
+    p95 = sorted(ctx)[int(0.95 * (len(ctx) - 1))] if ctx else 0
+    print(f"{name:>14}: {len(sizes):5d} docs, max {max(sizes, default=0):6d} tok/doc, "
+          f"context/question mean {statistics.mean(ctx) if ctx else 0:8.0f} p95 {p95:6d} tok")
+    return statistics.mean(ctx) if ctx else 0
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "data/papers"
+    papers = [parse_pdf_to_json(p) for p in sorted(glob.glob(os.path.join(folder, "*.pdf")))]
+    print(f"{len(papers)} papers, {len(QUESTIONS)} questions each, k={K}")
+    before = report("whole-section", [whole_section_documents(p) for p in papers])
+    after = report("chunked", [json_to_documents(p) for p in papers])
+    if before:
+        print(f"context token reduction per question: {100 * (1 - after / before):.1f}%")
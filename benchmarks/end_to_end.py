@@ -0,0 +1,217 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ingestion.chunker import json_to_documents
+from ingestion.extractor import parse_pdf_to_json
+from rag.chain import build_rag_chain
+from rag.fakes import HashEmbeddings, fake_chat_model
+from rag.retrieval import FETCH_K, K, LAMBDA_MULT, HybridRetriever
+from rag.vector_store import PERSIST_DIRECTORIES, VECTOR_BACKEND, create_or_load_vectorstore, lexical_index
+
+# Offline end-to-end run over data/papers: parse -> chunk -> index ->
+# retrieve -> answer, with deterministic hash embeddings and a fake chat
+# model so numbers only reflect this code. Writes a JSON report; given a
+# baseline report it flags metrics that got worse by more than --tolerance
+# and exits 1.
+
+QUESTIONS = 50
+WARMUP_QUESTIONS = 5
+SEED = 0
+# Changes smaller than these are scheduler noise on a shared machine (chunking and
+# retrieval take milliseconds), whatever the relative change.
+NOISE_FLOOR = {"_ms": 5.0, "_s": 0.25}
+# Metric name -> True if higher is better. Only these are compared; tail
+# percentiles are reported but too noisy over 50 questions to gate on.
+COMPARED = {
+    "parse.wall_s": False,
+    "parse.pages_per_s": True,
+    "chunk.wall_s": False,
+    "index.wall_s": False,
+    "index.chunks_per_s": True,
+    "index.size_bytes": False,
+    "retrieval.hybrid.p50_ms": False,
+    "retrieval.dense.p50_ms": False,
+    "retrieval.lexical.p50_ms": False,
+    "chain.p50_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def percentiles(timings_ms):
+    ordered = sorted(timings_ms)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1],
+    }
+
+
+def sample_questions(docs, n=QUESTIONS, seed=SEED):
+    # Deterministic questions built from words of random chunks, so both the
+    # lexical and dense paths have something to find.
+    rng = random.Random(seed)
+    questions = []
+    for doc in rng.sample(docs, min(n, len(docs))):
+        words = doc.page_content.split()
+        start = rng.randrange(max(1, len(words) - 8))
+        questions.append("What does the paper say about " + " ".join(words[start:start + 8]) + "?")
+    return questions
+
+
+def run(pdfs, backend, questions=QUESTIONS):
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": backend,
+        "papers": len(pdfs),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        papers = []
+        for path in pdfs:
+            try:
+                papers.append(parse_pdf_to_json(path, use_cache=False))
+            except Exception as e:
+                print(f"Could not parse {os.path.basename(path)}: {e}")
+        wall = time.perf_counter() - start
+        pages = sum(p.get("num_pages") or 0 for p in papers)
+        report["parse"] = {"wall_s": wall, "pages": pages, "pages_per_s": pages / wall if wall else 0.0}
+
+        start = time.perf_counter()
+        docs = [d for paper in papers for d in json_to_documents(paper)]
+        wall = time.perf_counter() - start
+        report["chunk"] = {"wall_s": wall, "chunks": len(docs), "chunks_per_s": len(docs) / wall if wall else 0.0}
+
+        embedding = HashEmbeddings()
+        persist_directory = os.path.join(tmp, "index")
+        start = time.perf_counter()
+        vectordb = create_or_load_vectorstore(docs, persist_directory, embedding, backend)
+        wall = time.perf_counter() - start
+        report["index"] = {
+            "wall_s": wall,
+            "chunks_per_s": len(docs) / wall if wall else 0.0,
+            "texts_embedded": embedding.texts_embedded,
+            "size_bytes": directory_size(tmp),
+        }
+
+        asked = sample_questions(docs, questions)
+        report["retrieval"] = {}
+        for mode in ("dense", "lexical", "hybrid"):
+            retriever = HybridRetriever(
+                vectorstore=vectordb, k=K, fetch_k=FETCH_K, lambda_mult=LAMBDA_MULT,
+                lexical_index=lexical_index(vectordb), mode=mode,
+            )
+            for question in asked[:WARMUP_QUESTIONS]:
+                retriever.invoke(question)
+            timings = []
+            for question in asked:
+                start = time.perf_counter()
+                retriever.invoke(question)
+                timings.append((time.perf_counter() - start) * 1000)
+            report["retrieval"][mode] = percentiles(timings)
+
+        chain = build_rag_chain(vectordb, "default", llm=fake_chat_model())
+        for question in asked[:WARMUP_QUESTIONS]:
+            chain.invoke(question)
+        timings = []
+        for question in asked:
+            start = time.perf_counter()
+            chain.invoke(question)
+            timings.append((time.perf_counter() - start) * 1000)
+        report["chain"] = percentiles(timings)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def metric(report, name):
+    value = report
+    for part in name.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, higher_is_better in COMPARED.items():
+        new, old = metric(report, name), metric(baseline, name)
+        if not new or not old:
+            continue
+        floor = next((f for suffix, f in NOISE_FLOOR.items() if name.endswith(suffix)), 0)
+        if abs(new - old) < floor:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+def print_summary(report):
+    print(f"{report['papers']} papers on {report['backend']}")
+    print(f"  parse  {report['parse']['wall_s']:7.2f}s  {report['parse']['pages']} pages  {report['parse']['pages_per_s']:.1f} pages/s")
+    print(f"  chunk  {report['chunk']['wall_s']:7.2f}s  {report['chunk']['chunks']} chunks  {report['chunk']['chunks_per_s']:.0f} chunks/s")
+    print(f"  index  {report['index']['wall_s']:7.2f}s  {report['index']['chunks_per_s']:.0f} chunks/s  {report['index']['size_bytes'] / 1e6:.1f} MB on disk")
+    for mode, stats in report["retrieval"].items():
+        print(f"  retrieval {mode:<8} p50 {stats['p50_ms']:6.2f} ms  p95 {stats['p95_ms']:6.2f} ms  p99 {stats['p99_ms']:6.2f} ms")
+    print(f"  chain            p50 {report['chain']['p50_ms']:6.2f} ms  p95 {report['chain']['p95_ms']:6.2f} ms")
+    print(f"  peak RSS {report['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark over a folder of PDFs.")
+    parser.add_argument("--papers", default="data/papers")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N PDFs")
+    parser.add_argument("--backend", choices=sorted(PERSIST_DIRECTORIES), default=VECTOR_BACKEND)
+    parser.add_argument("--questions", type=int, default=QUESTIONS)
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.papers, "*.pdf")))[:args.limit]
+    report = run(pdfs, args.backend, args.questions)
+    print_summary(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
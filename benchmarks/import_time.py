@@ -0,0 +1,88 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Import-time regression check for the app's cold start. Runs app.py once in
+# Streamlit's bare mode under `python -X importtime`, subtracts what
+# `import streamlit` costs on its own, and fails (exit code 1) if a heavy
+# backend is imported before the first render or the app's own imports go
+# over budget.
+
+# Each of these takes 0.1-2 s to import and is only needed once papers are
+# selected or a question is asked.
+HEAVY_MODULES = (
+    "chromadb",
+    "langchain_community",
+    "langchain_google_genai",
+    "langchain_core",
+    "pdfplumber",
+    "pdfminer",
+    "fitz",
+    "pymupdf",
+    "httpx",
+    "arxiv",
+)
+APP_IMPORT_BUDGET_MS = 150
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def importtime(args):
+    env = dict(os.environ, APP_WARM_UP="0", PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    rows = []
+    for line in result.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows, wall
+
+
+def app_imports():
+    # Rows for the modules app.py imports beyond what streamlit already does.
+    baseline, baseline_wall = importtime(["-c", "import streamlit"])
+    app, app_wall = importtime(["app.py"])
+    known = {name for name, *_ in baseline}
+    return [row for row in app if row[0] not in known], baseline, baseline_wall, app_wall
+
+
+def heavy_imports(rows):
+    return sorted({name for name, *_ in rows if name.split(".")[0] in HEAVY_MODULES})
+
+
+def main():
+    extra, baseline, baseline_wall, app_wall = app_imports()
+    app_ms = sum(self_us for _, self_us, _, _ in extra) / 1000
+    heavy = heavy_imports(extra)
+
+    print(f"import streamlit:               {sum(r[1] for r in baseline) / 1000:8.1f} ms")
+    print(f"app imports beyond streamlit:   {app_ms:8.1f} ms ({len(extra)} modules, budget {APP_IMPORT_BUDGET_MS} ms)")
+    print(f"cold start to first render:     {app_wall * 1000:8.1f} ms (python app.py in bare mode; bare interpreter + streamlit {baseline_wall * 1000:.0f} ms)")
+    print("slowest app imports (cumulative):")
+    top_level = [r for r in extra if r[3] <= 1]
+    for name, _, cumulative_us, _ in sorted(top_level, key=lambda r: -r[2])[:10]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    if heavy:
+        failed = True
+        print(f"FAIL: heavy modules imported before first render: {', '.join(heavy[:10])}")
+    if app_ms > APP_IMPORT_BUDGET_MS:
+        failed = True
+        print(f"FAIL: app imports took {app_ms:.1f} ms, budget is {APP_IMPORT_BUDGET_MS} ms")
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
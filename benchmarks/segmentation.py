@@ -0,0 +1,84 @@
+import glob
+import os
+import re
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ingestion.extractor import EXTRACTION_STRATEGY, PREAMBLE_TITLE, extract_pages_from_pdf, join_pages, split_by_headings
+
+# Heading detection on the default extractor's output (and on pdfplumber's,
+# for comparison): sections found and papers that collapse to a single
+# PREAMBLE section. Then throughput of the line-based segmenter against the
+# regex split_by_headings used before, over the same text plus a few
+# adversarial inputs (all-caps tables, reference lists, one enormous caps line).
+
+REPEATS = 5
+_LEGACY_PATTERN = r"(?<=\n)([A-Z][A-Z\s\d:]{3,})\n"
+
+
+def legacy_split_by_headings(text):
+    sections = re.split(_LEGACY_PATTERN, text)
+    return [
+        {"section_title": sections[i].strip(), "content": sections[i + 1].strip()}
+        for i in range(1, len(sections), 2)
+    ]
+
+
+def pathological_inputs():
+    return {
+        "caps table": "\n" + "ABC DEF 123 GHI\n" * 50000,
+        "caps table, no final newline": "\n" + "ABC DEF 123 GHI\n" * 50000 + "x",
+        "reference list": "\n" + "[12] A. B. SMITH, J. DOE, PHYS. REV. LETT. 113, 1 (2014).\n" * 20000,
+        "one long caps line": "\n" + "A " * 400000,
+        "caps lines ending lowercase": ("\nAAAA BBBB CCCC DDDD" * 2000 + "a") * 10,
+    }
+
+
+def detection(pages_by_paper):
+    sections = 0
+    preamble_only = []
+    for name, pages in pages_by_paper.items():
+        text, page_starts = join_pages(pages)
+        found = split_by_headings(text, page_starts)
+        sections += len(found)
+        if all(s["section_title"] == PREAMBLE_TITLE for s in found):
+            preamble_only.append(name)
+    return sections, preamble_only
+
+
+def throughput(fn, texts, repeats=REPEATS):
+    size = sum(len(t) for t in texts)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for text in texts:
+            fn(text)
+    elapsed = time.perf_counter() - start
+    return elapsed / repeats, size / (elapsed / repeats) / 1e6
+
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else "data/papers"
+    pdfs = sorted(glob.glob(os.path.join(folder, "*.pdf")))
+    print("heading detection:")
+    texts = []
+    for strategy in (EXTRACTION_STRATEGY, "pdfplumber"):
+        pages_by_paper = {os.path.basename(p): extract_pages_from_pdf(p, strategy=strategy)[0] for p in pdfs}
+        sections, preamble_only = detection(pages_by_paper)
+        label = f"{strategy} (default)" if strategy == EXTRACTION_STRATEGY else strategy
+        print(f"  {label:>28}: {sections} sections, {len(preamble_only)} papers with no heading found")
+        for name in preamble_only:
+            print(f"    {name}")
+        if strategy == EXTRACTION_STRATEGY:
+            texts = [join_pages(pages)[0] for pages in pages_by_paper.values()]
+    print(f"{len(texts)} papers, {sum(len(t) for t in texts) / 1e6:.1f} MB of text ({EXTRACTION_STRATEGY})")
+    for name, fn in (("legacy regex", legacy_split_by_headings), ("line-based", split_by_headings)):
+        seconds, mbps = throughput(fn, texts)
+        sections = sum(len(fn(t)) for t in texts)
+        print(f"{name:>13}: {seconds * 1000:8.1f} ms/corpus  {mbps:7.1f} MB/s  {sections} sections")
+    print("pathological inputs (ms):")
+    for name, text in pathological_inputs().items():
+        legacy, _ = throughput(legacy_split_by_headings, [text], repeats=1)
+        current, _ = throughput(split_by_headings, [text], repeats=1)
+        print(f"  {name:>28}: legacy {legacy * 1000:9.1f}  line-based {current * 1000:9.1f}")
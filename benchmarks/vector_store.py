@@ -0,0 +1,85 @@
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from rag.numpy_store import NumpyVectorStore
+
+# Build time, query latency and recall@k of the NumPy backends (flat and IVF)
+# against Chroma, on clustered synthetic vectors so no embedding API is
+# involved. Recall is measured against an exact brute-force top-k.
+
+N = int(os.getenv("BENCH_N", "20000"))
+DIM = int(os.getenv("BENCH_DIM", "256"))
+QUERIES = 200
+K = 10
+
+
+class LookupEmbeddings(Embeddings):
+    # Texts are keys into a precomputed matrix.
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(t)].tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.vectors[int(text)].tolist()
+
+
+def clustered_vectors(n, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    points = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def measure(name, build, data, queries, truth):
+    start = time.perf_counter()
+    store = build()
+    build_seconds = time.perf_counter() - start
+    latencies = []
+    recall = []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        docs = store.similarity_search_by_vector(q.tolist(), k=K)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recall.append(len({int(d.page_content) for d in docs} & set(expected)) / K)
+    latencies.sort()
+    print(f"{name:>10}: build {build_seconds:7.2f}s  query p50 {statistics.median(latencies):7.3f} ms  "
+          f"p95 {latencies[int(0.95 * (len(latencies) - 1))]:7.3f} ms  recall@{K} {statistics.mean(recall):.3f}")
+
+
+if __name__ == "__main__":
+    data = clustered_vectors(N + QUERIES, DIM)
+    corpus, queries = data[:N], data[N:]
+    truth = [np.argsort(-(corpus @ q))[:K].tolist() for q in queries]
+    embedding = LookupEmbeddings(corpus)
+    texts = [str(i) for i in range(N)]
+    ids = [f"id-{i}" for i in range(N)]
+    print(f"{N} vectors x {DIM} dims, {QUERIES} queries")
+    tmp = tempfile.mkdtemp()
+    try:
+        measure("numpy", lambda: NumpyVectorStore.from_texts(
+            texts, embedding, ids=ids, persist_directory=os.path.join(tmp, "flat")), corpus, queries, truth)
+        measure("numpy-ivf", lambda: NumpyVectorStore.from_texts(
+            texts, embedding, ids=ids, persist_directory=os.path.join(tmp, "ivf"), index_type="ivf"), corpus, queries, truth)
+        try:
+            from langchain_community.vectorstores import Chroma
+        except ImportError:
+            print("    chroma: not installed, skipped")
+        else:
+            def build_chroma():
+                store = Chroma(persist_directory=os.path.join(tmp, "chroma"), embedding_function=embedding)
+                for start in range(0, N, 5000):
+                    store.add_texts(texts[start:start + 5000], ids=ids[start:start + 5000])
+                return store
+            measure("chroma", build_chroma, corpus, queries, truth)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
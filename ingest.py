@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from langchain_core.embeddings import Embeddings
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__)))
+
+from ingestion.chunker import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS
+from ingestion.extractor import EXTRACTION_STRATEGY, EXTRACTOR_VERSION
+from ingestion.parse_cache import file_sha256
+from ingestion.pipeline import run_pipeline
+from rag.embeddings import EMBEDDING_MODEL, get_embeddings
+from rag.vector_store import PERSIST_DIRECTORIES, VECTOR_BACKEND, create_or_load_vectorstore, delete_chunks
+from utils import metrics
+
+MANIFEST_FORMAT = 2
+MANIFEST_NAME = "manifest.json"
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self, inner):
+        self.inner = inner
+        self.texts_embedded = 0
+
+    def embed_documents(self, texts):
+        self.texts_embedded += len(texts)
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.inner.embed_query(text)
+
+
+def index_settings(backend, embedding_model):
+    # Anything that changes what lands in the index. A manifest written under
+    # different settings is ignored and every file is ingested again.
+    return {
+        "backend": backend,
+        "embedding_model": embedding_model,
+        "extractor_version": EXTRACTOR_VERSION,
+        "extraction_strategy": EXTRACTION_STRATEGY,
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+    }
+
+
+def load_manifest(path, settings):
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("format") == MANIFEST_FORMAT and manifest.get("settings") == settings:
+                return manifest
+            print("Index settings changed since the last ingest; re-indexing every file.")
+        except (OSError, ValueError) as e:
+            print("Could not read manifest:", e)
+    return {"format": MANIFEST_FORMAT, "version": 0, "settings": settings, "files": {}}
+
+
+def save_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def find_pdfs(directory):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith(".pdf")
+    )
+
+
+def ingest_directory(directory="data/papers", backend=None, persist_directory=None, embedding=None,
+                     workers=None, force=False):
+    backend = backend or VECTOR_BACKEND
+    persist_directory = persist_directory or PERSIST_DIRECTORIES[backend]
+    embedding = CountingEmbeddings(embedding or get_embeddings())
+    model_name = getattr(embedding.inner, "model_name", EMBEDDING_MODEL)
+    manifest_path = os.path.join(persist_directory, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path, index_settings(backend, model_name))
+
+    pdfs = find_pdfs(directory)
+    hashes = {path: file_sha256(path) for path in pdfs}
+    known = manifest["files"]
+    changed = [p for p in pdfs if force or known.get(os.path.relpath(p, directory), {}).get("sha256") != hashes[p]]
+    removed = set(known) - {os.path.relpath(p, directory) for p in pdfs}
+    # Chunks of deleted files, and the old chunks of changed ones, are dropped
+    # from the index unless another file still has them.
+    stale = {i for name in removed for i in known[name].get("chunk_ids", ())}
+    for name in removed:
+        del known[name]
+    print(f"{len(pdfs)} PDFs in {directory}: {len(changed)} new or changed, {len(pdfs) - len(changed)} unchanged")
+
+    report = {"papers": 0, "pages": 0, "chunks": 0, "wall_s": 0.0, "stages": [], "indexed": {}}
+    if changed:
+        report = run_pipeline(
+            paths=changed,
+            parse_workers=workers,
+            index=lambda docs: create_or_load_vectorstore(docs, persist_directory, embedding, backend),
+        )
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    for path, counts in report["indexed"].items():
+        name = os.path.relpath(path, directory)
+        stale.update(known.get(name, {}).get("chunk_ids", ()))
+        known[name] = {"sha256": hashes[path], "indexed_at": now, **counts}
+    stale -= {i for entry in known.values() for i in entry.get("chunk_ids", ())}
+    if stale:
+        delete_chunks(stale, persist_directory, embedding, backend)
+        print(f"Removed {len(stale)} stale chunks from the index")
+    if report["indexed"] or removed:
+        manifest["version"] += 1
+        manifest["updated_at"] = now
+        save_manifest(manifest_path, manifest)
+    report["embeddings"] = embedding.texts_embedded
+    report["skipped"] = len(pdfs) - len(changed)
+    report["deleted"] = len(stale)
+    report["manifest"] = manifest_path
+    report["index_version"] = manifest["version"]
+    return report
+
+
+def format_throughput(report):
+    wall = report["wall_s"] or float("inf")
+    return (
+        f"{report['papers']} papers ({report['skipped']} unchanged, skipped) in {report['wall_s']:.1f}s: "
+        f"{report['pages'] / wall:.1f} pages/s, {report['chunks'] / wall:.1f} chunks/s, "
+        f"{report['embeddings'] / wall:.1f} embeddings/s ({report['embeddings']} new vectors). "
+        f"Manifest v{report['index_version']} at {report['manifest']}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse, chunk and embed every PDF in a directory into the index.")
+    parser.add_argument("directory", nargs="?", default="data/papers")
+    parser.add_argument("--backend", choices=sorted(PERSIST_DIRECTORIES), default=VECTOR_BACKEND)
+    parser.add_argument("--persist-directory", default=None)
+    parser.add_argument("--workers", type=int, default=None, help="parse processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="re-ingest files whose content hash is unchanged")
+    parser.add_argument("--stages", action="store_true", help="also print per-stage pipeline metrics")
+    parser.add_argument("--metrics", default=None, help="write spans, counters and timings here (.prom for Prometheus text, else JSON)")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    start = time.perf_counter()
+    report = ingest_directory(args.directory, args.backend, args.persist_directory, workers=args.workers, force=args.force)
+    if args.stages and report["stages"]:
+        from ingestion.pipeline import format_report
+        print(format_report(report))
+    print(format_throughput(report))
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(metrics.prometheus_text() if args.metrics.endswith(".prom") else metrics.to_json())
+        print(f"Metrics written to {args.metrics}")
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
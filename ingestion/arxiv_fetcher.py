@@ -1,16 +1,158 @@
-import arxiv
+import asyncio
 import os
+import re
+import time
+import xml.etree.ElementTree as ET
+import httpx
 
-def download_latest_papers(query="LLM", max_results=3, save_dir="data/papers"):
-    search = arxiv.Search(
-        query=query,
-        max_results=max_results,
-        sort_by=arxiv.SortCriterion.SubmittedDate
-    )
-
-    downloaded = []
-    for result in search.results():
-        paper_path = os.path.join(save_dir, f"{result.title[:50]}.pdf")
-        result.download_pdf(filename=paper_path)
-        downloaded.append(paper_path)
-    return downloaded
+ARXIV_API_URL = os.getenv("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+# arXiv asks clients to stay around one request every three seconds; a small
+# burst lets a handful of papers start at once.
+REQUESTS_PER_SECOND = float(os.getenv("ARXIV_REQUESTS_PER_SECOND", 1 / 3))
+BURST = 3
+MAX_CONCURRENT_DOWNLOADS = 4
+MAX_ATTEMPTS = 3
+TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+CHUNK_SIZE = 1 << 16
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_VERSION = re.compile(r"v\d+$")
+# "2507.22491v1.Some_Title.pdf", or "hep-th_9901001v1.Title.pdf" for old IDs.
+_FILE_ID = re.compile(r"^(\d{4}\.\d{4,5}|[a-z.-]+_\d{7})(?:v\d+)?\.")
+
+
+class TokenBucket:
+    # Allows `rate` requests per second on average with bursts up to
+    # `capacity`. Waiters sleep only as long as the next token needs.
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def base_id(arxiv_id):
+    return _VERSION.sub("", arxiv_id).replace("/", "_")
+
+
+def paper_filename(entry):
+    # Same naming as arxiv.Result.download_pdf, which data/papers already uses.
+    title = re.sub(r"[^\w]", "_", entry["title"])
+    return f"{entry['id'].replace('/', '_')}.{title}.pdf"
+
+
+def parse_feed(xml_text):
+    entries = []
+    for item in ET.fromstring(xml_text).iter(f"{_ATOM}entry"):
+        entry_id = item.findtext(f"{_ATOM}id", "").strip()
+        if not entry_id:
+            continue
+        pdf_url = None
+        for link in item.iter(f"{_ATOM}link"):
+            if link.get("title") == "pdf" or link.get("type") == "application/pdf":
+                pdf_url = link.get("href")
+        entries.append({
+            "id": entry_id.rsplit("/abs/", 1)[-1],
+            "title": " ".join(item.findtext(f"{_ATOM}title", "").split()),
+            "published": item.findtext(f"{_ATOM}published", ""),
+            "pdf_url": pdf_url or entry_id.replace("/abs/", "/pdf/"),
+        })
+    return entries
+
+
+def existing_papers(save_dir):
+    # arXiv ID (without version) -> path of the PDF already on disk.
+    if not os.path.isdir(save_dir):
+        return {}
+    present = {}
+    for name in os.listdir(save_dir):
+        match = _FILE_ID.match(name)
+        if match and name.endswith(".pdf"):
+            present[match.group(1)] = os.path.join(save_dir, name)
+    return present
+
+
+async def search_papers(client, limiter, query, max_results, api_url=ARXIV_API_URL):
+    await limiter.acquire()
+    response = await client.get(api_url, params={
+        "search_query": query,
+        "start": 0,
+        "max_results": max_results,
+        "sortBy": "submittedDate",
+        "sortOrder": "descending",
+    })
+    response.raise_for_status()
+    return parse_feed(response.text)
+
+
+async def download_pdf(client, limiter, url, path):
+    # Streams into path + ".part" and renames on completion. A leftover
+    # .part file from an interrupted run is resumed with a Range request.
+    part_path = path + ".part"
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        await limiter.acquire()
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 416:
+                    # The partial file is already complete.
+                    break
+                response.raise_for_status()
+                mode = "ab" if offset and response.status_code == 206 else "wb"
+                with open(part_path, mode) as f:
+                    async for block in response.aiter_bytes(CHUNK_SIZE):
+                        f.write(block)
+            break
+        except httpx.TransportError:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            await asyncio.sleep(attempt)
+    os.replace(part_path, path)
+    return path
+
+
+async def fetch_papers(query="LLM", max_results=3, save_dir="data/papers", api_url=ARXIV_API_URL,
+                       max_concurrency=MAX_CONCURRENT_DOWNLOADS, limiter=None, on_download=None):
+    # Returns the PDF paths for the search results in feed order. Papers
+    # already in save_dir (matched by arXiv ID) are not downloaded again.
+    os.makedirs(save_dir, exist_ok=True)
+    limiter = limiter or TokenBucket()
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=TIMEOUT, follow_redirects=True) as client:
+        entries = await search_papers(client, limiter, query, max_results, api_url)
+        present = existing_papers(save_dir)
+
+        async def fetch(entry):
+            path = present.get(base_id(entry["id"]))
+            if path is None:
+                async with semaphore:
+                    try:
+                        path = os.path.join(save_dir, paper_filename(entry))
+                        path = await download_pdf(client, limiter, entry["pdf_url"], path)
+                    except httpx.HTTPError as e:
+                        print(f"Could not download '{entry['title']}': {e}")
+                        return None
+            if on_download is not None:
+                on_download(path)
+            return path
+
+        paths = await asyncio.gather(*(fetch(entry) for entry in entries))
+    return [p for p in paths if p]
+
+
+def download_latest_papers(query="LLM", max_results=3, save_dir="data/papers", **kwargs):
+    return asyncio.run(fetch_papers(query, max_results, save_dir, **kwargs))
@@ -1,11 +1,69 @@
 from langchain_core.documents import Document
+from utils import metrics
 
-def json_to_documents(json_data):
+# Rough average for English scientific text; good enough for budgeting
+# without pulling in a tokenizer.
+CHARS_PER_TOKEN = 4
+CHUNK_TOKENS = 350
+CHUNK_OVERLAP_TOKENS = 50
+MIN_CHUNK_CHARS = 30
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _cut_point(text, lo, hi):
+    # Prefer ending on a paragraph, then a sentence, then a word boundary in
+    # the tail of the window.
+    cut = text.rfind("\n\n", lo, hi)
+    if cut > lo:
+        return cut
+    for mark in (". ", ".\n", "? ", "! "):
+        cut = text.rfind(mark, lo, hi)
+        if cut > lo:
+            return cut + 1
+    cut = max(text.rfind(" ", lo, hi), text.rfind("\n", lo, hi))
+    return cut if cut > lo else hi
+
+def split_text(text, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    # Single left-to-right pass; each window is scanned at most once for a
+    # cut point, so this stays linear in the section length.
+    max_chars = max(chunk_tokens * CHARS_PER_TOKEN, 1)
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, max_chars // 2)
+    n = len(text)
+    chunks = []
+    start = 0
+    while start < n:
+        end = min(start + max_chars, n)
+        if end < n:
+            end = _cut_point(text, start + (max_chars * 3) // 5, end)
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= n:
+            break
+        next_start = max(end - overlap_chars, start + 1)
+        # Start the overlap on a word boundary.
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+def section_to_documents(section, source, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    metadata = {"section": section["section_title"], "source": source}
+    # Chroma rejects None metadata, so page keys are only set when known.
+    if section.get("page") is not None:
+        metadata["page"] = section["page"]
+        metadata["page_end"] = section.get("page_end", section["page"])
     docs = []
-    for section in json_data["sections"]:
-        if len(section["content"].strip()) > 30:
-            docs.append(Document(
-                page_content=section["content"],
-                metadata={"section": section["section_title"], "source": json_data.get("title")}
-            ))
+    for chunk in split_text(section["content"], chunk_tokens, overlap_tokens):
+        if len(chunk) > MIN_CHUNK_CHARS:
+            docs.append(Document(page_content=chunk, metadata={**metadata, "chunk": len(docs)}))
+    return docs
+
+def json_to_documents(json_data, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    with metrics.span("chunk", file=json_data.get("title")) as span:
+        docs = []
+        for section in json_data["sections"]:
+            docs.extend(section_to_documents(section, json_data.get("title"), chunk_tokens, overlap_tokens))
+        span.set(chunks=len(docs))
+        metrics.increment("chunk.chunks", len(docs))
     return docs
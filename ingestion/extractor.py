@@ -1,50 +1,361 @@
-import pdfplumber
 import os
+import re
+import time
+import multiprocessing
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ingestion import parse_cache
+from utils import metrics
 
-def extract_text_from_pdf(pdf_path):
-    text = ""
-    method = "pdfplumber"
-    try:
+# Bump whenever extraction or segmentation output changes so stale parse
+# cache entries are ignored.
+EXTRACTOR_VERSION = 6
+# Backends in the order they are tried. Pages the first backend gets wrong
+# (empty, or below MIN_PAGE_QUALITY) are re-extracted by the next one.
+EXTRACTION_STRATEGY = "pymupdf,pdfplumber"
+MIN_PAGE_QUALITY = 0.9
+
+# pdfplumber keeps every parsed page object alive for the lifetime of the open
+# document, so long PDFs are reopened every PAGES_PER_OPEN pages.
+PAGES_PER_OPEN = 25
+PAGES_PER_TASK = 25
+# Pages a backend pass needs before spawning page workers costs less than it
+# saves. PyMuPDF reads a few hundred pages a second in-process, so only very
+# long documents are worth spreading out.
+PARALLEL_MIN_PAGES = {"pymupdf": 400, "pdfplumber": 60}
+
+# Heading candidates are whole lines found by one line-anchored scan with no
+# nested quantifiers, so segmentation stays linear in the text length however
+# the PDF is laid out (all-caps tables, reference lists, giant lines).
+MAX_HEADING_CHARS = 90
+MAX_HEADING_WORDS = 10
+MAX_SECTION_NUMBER = 20
+# A run of at least MAX_EMPTY_RUN headings with under MIN_SECTION_CHARS of
+# text after each is a table or list of caps/numbered rows, not sections.
+MAX_EMPTY_RUN = 3
+MIN_SECTION_CHARS = 40
+PREAMBLE_TITLE = "PREAMBLE"
+CAPTION_WORDS = ("FIG", "FIGURE", "TABLE")
+_CAPS = r"[A-Z][A-Z\d :\t-]{3,}"
+_NUMBER = r"\d{1,2}(?:\.\d{1,2}){0,3}\.?|[IVX]{1,4}\."
+# PyMuPDF puts a section number on its own line ("2.1\nBackground"), so a
+# line holding only a number is read together with the line after it.
+_HEADING_CANDIDATE = re.compile(rf"^[ \t]*({_CAPS}|(?:{_NUMBER})(?:[ \t]+|[ \t]*\n[ \t]*)\S[^\n]*)$", re.M)
+_CAPS_HEADING = re.compile(_CAPS)
+_NUMBERED_HEADING = re.compile(rf"({_NUMBER})[ \t]+(\S.*)")
+_NON_BLANK = re.compile(r"\S")
+_FOUR_LETTERS = re.compile(r"(?:[^A-Z]*[A-Z]){4}")
+# A single all-caps word is a heading only if it is one of these; otherwise
+# acronyms on their own line ("LSTM", "QUBO", "FWHM") start sections.
+SECTION_WORDS = frozenset(
+    "ABSTRACT INTRODUCTION BACKGROUND THEORY METHOD METHODS METHODOLOGY MATERIALS EXPERIMENTAL "
+    "EXPERIMENTS RESULTS DISCUSSION CONCLUSION CONCLUSIONS SUMMARY OUTLOOK ACKNOWLEDGMENT "
+    "ACKNOWLEDGMENTS ACKNOWLEDGEMENT ACKNOWLEDGEMENTS FUNDING REFERENCES BIBLIOGRAPHY APPENDIX "
+    "APPENDICES ABBREVIATIONS NOMENCLATURE CONTENTS".split()
+)
+
+_GARBLED = re.compile(r"\(cid:\d+\)|[\x00-\x08\x0b\x0c\x0e-\x1f\ufffd\ue000-\uf8ff]")
+
+def page_quality(text):
+    # Share of characters that are real text; unmapped glyphs such as
+    # "(cid:12)", replacement characters and private-use codepoints count
+    # against it.
+    stripped = text.strip()
+    if not stripped:
+        return 0.0
+    bad = sum(len(m) for m in _GARBLED.findall(stripped))
+    return 1.0 - bad / len(stripped)
+
+def count_pages(pdf_path, backend="pdfplumber"):
+    if backend == "pymupdf":
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf  # PyMuPDF < 1.24.3
+        with pymupdf.open(pdf_path) as doc:
+            return doc.page_count
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def iter_pdfplumber_pages(pdf_path, start=0, end=None, pages_per_open=PAGES_PER_OPEN):
+    # Yields (page_number, text) with 1-based page numbers. pdfplumber (and
+    # pdfminer under it) is only imported once a PDF actually needs it.
+    import pdfplumber
+    page_index = start
+    while True:
         with pdfplumber.open(pdf_path) as pdf:
-            text = "\n".join([page.extract_text() or "" for page in pdf.pages])
-        if text.strip():
-            return text, method
-    except Exception as e:
-        print("pdfplumber failed:", e)
-    # Fallback to PyMuPDF
+            stop = len(pdf.pages) if end is None else min(end, len(pdf.pages))
+            batch_end = min(stop, page_index + pages_per_open)
+            for i in range(page_index, batch_end):
+                page = pdf.pages[i]
+                text = page.extract_text() or ""
+                page.close()
+                yield i + 1, text
+        page_index = batch_end
+        if page_index >= stop:
+            return
+
+def iter_pymupdf_pages(pdf_path, start=0, end=None):
     try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(pdf_path)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        method = "pymupdf"
-        if text.strip():
-            return text, method
-    except Exception as e:
-        print("PyMuPDF also failed:", e)
-    return text, method
+        import pymupdf
+    except ImportError:
+        import fitz as pymupdf  # PyMuPDF < 1.24.3
+    with pymupdf.open(pdf_path) as doc:
+        stop = doc.page_count if end is None else min(end, doc.page_count)
+        for i in range(start, stop):
+            yield i + 1, doc[i].get_text()
+
+BACKENDS = {
+    "pymupdf": iter_pymupdf_pages,
+    "pdfplumber": iter_pdfplumber_pages,
+}
+
+def _page_ranges(numbers):
+    # Collapses sorted 1-based page numbers into 0-based [start, end) ranges.
+    ranges = []
+    for number in numbers:
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number - 1, number])
+    return ranges
+
+def _extract_page_range(backend, pdf_path, start, end):
+    return list(BACKENDS[backend](pdf_path, start, end))
+
+def iter_pages_parallel(pdf_path, workers, backend="pdfplumber", ranges=None, pages_per_task=PAGES_PER_TASK):
+    # Page ranges of one PDF (every page unless ranges is given) are spread
+    # over worker processes and yielded back in page order. At most
+    # 2 * workers tasks are in flight, which bounds how much extracted text
+    # sits in memory ahead of the consumer.
+    if ranges is None:
+        ranges = [(0, count_pages(pdf_path, backend))]
+    tasks = deque(
+        (i, min(i + pages_per_task, end)) for start, end in ranges for i in range(start, end, pages_per_task)
+    )
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        in_flight = deque()
+        while tasks or in_flight:
+            while tasks and len(in_flight) < 2 * workers:
+                start, end = tasks.popleft()
+                in_flight.append(pool.submit(_extract_page_range, backend, pdf_path, start, end))
+            yield from in_flight.popleft().result()
+
+def _iter_backend(backend, pdf_path, page_numbers, workers):
+    # Page workers are used for whichever pass (the full first pass or the
+    # fallback's retry pages) is long enough to pay for them.
+    min_pages = PARALLEL_MIN_PAGES.get(backend, PARALLEL_MIN_PAGES["pdfplumber"])
+    if page_numbers is None:
+        if workers > 1 and count_pages(pdf_path, backend) >= min_pages:
+            yield from iter_pages_parallel(pdf_path, workers, backend)
+        else:
+            yield from BACKENDS[backend](pdf_path)
+        return
+    ranges = _page_ranges(page_numbers)
+    if workers > 1 and len(page_numbers) >= min_pages:
+        yield from iter_pages_parallel(pdf_path, workers, backend, ranges)
+        return
+    for start, end in ranges:
+        yield from BACKENDS[backend](pdf_path, start, end)
+
+@metrics.traced("extract.pages")
+def extract_pages_from_pdf(pdf_path, workers=1, strategy=EXTRACTION_STRATEGY, min_quality=MIN_PAGE_QUALITY):
+    # Returns (pages, method, report). report records which backend produced
+    # each page and the time spent in every backend.
+    backends = [b.strip() for b in strategy.split(",") if b.strip()]
+    best = {}
+    timings = {}
+    retry = None  # None means every page
+    for backend in backends:
+        started = time.perf_counter()
+        failed = False
+        try:
+            for number, text in _iter_backend(backend, pdf_path, retry, workers):
+                quality = page_quality(text)
+                if number not in best or quality > best[number][2]:
+                    best[number] = (text, backend, quality)
+        except Exception as e:
+            failed = True
+            print(f"{backend} failed:", e)
+        timings[backend] = round(time.perf_counter() - started, 4)
+        metrics.observe(f"extract.backend.{backend}", timings[backend])
+        # A backend that died part-way may have skipped pages entirely, so
+        # the next one gets a full pass.
+        if best and not failed:
+            retry = sorted(n for n, (_, _, quality) in best.items() if quality < min_quality)
+            if not retry:
+                break
+
+    numbers = sorted(best)
+    pages = [(n, best[n][0]) for n in numbers]
+    page_backends = [best[n][1] for n in numbers]
+    used = [b for b in backends if b in page_backends]
+    method = "+".join(used) if used else (backends[0] if backends else "none")
+    report = {"page_backends": page_backends, "backend_timings": timings}
+    return pages, method, report
+
+def join_pages(pages):
+    # Returns the document text plus the offset where each page starts, so
+    # positions in the text can be mapped back to page numbers.
+    parts = []
+    page_starts = []
+    offset = 0
+    for _, text in pages:
+        page_starts.append(offset)
+        parts.append(text)
+        offset += len(text) + 1
+    return "\n".join(parts), page_starts
+
+def extract_text_from_pdf(pdf_path, workers=1):
+    pages, method, _ = extract_pages_from_pdf(pdf_path, workers)
+    return join_pages(pages)[0], method
 
 def extract_math_images(pdf_path):
     # MathPix stub — you'd need a separate PDF-to-image and HTTP call
     return []  # Replace with real image OCR results if needed
 
-def parse_pdf_to_json(pdf_path):
-    raw_text, method = extract_text_from_pdf(pdf_path)
-    return {
-        "title": os.path.basename(pdf_path),
-        "sections": split_by_headings(raw_text),
-        "extraction_method": method
-    }
-
-def split_by_headings(text):
-    import re
-    pattern = r"(?<=\n)([A-Z][A-Z\s\d:]{3,})\n"
-    sections = re.split(pattern, text)
+def _parse_cache_key(pdf_path, strategy=EXTRACTION_STRATEGY):
+    try:
+        return parse_cache.cache_key(
+            parse_cache.file_sha256(pdf_path), EXTRACTOR_VERSION, f"{strategy}@{MIN_PAGE_QUALITY}"
+        )
+    except OSError as e:
+        print("Could not hash PDF for parse cache:", e)
+        return None
+
+def get_cached_parse(pdf_path, strategy=EXTRACTION_STRATEGY):
+    key = _parse_cache_key(pdf_path, strategy)
+    cached = parse_cache.get(key) if key else None
+    if cached is not None:
+        # The same bytes may have been uploaded under another name.
+        cached["title"] = os.path.basename(pdf_path)
+    return cached
+
+def parse_pdf_to_json(pdf_path, use_cache=True, page_workers=1, strategy=EXTRACTION_STRATEGY):
+    with metrics.span("extract.parse", file=os.path.basename(pdf_path)) as span:
+        if use_cache:
+            cached = get_cached_parse(pdf_path, strategy)
+            if cached is not None:
+                span.set(cached=True)
+                metrics.increment("extract.cache_hits")
+                return cached
+        pages, method, report = extract_pages_from_pdf(pdf_path, page_workers, strategy)
+        raw_text, page_starts = join_pages(pages)
+        page_numbers = [number for number, _ in pages]
+        result = {
+            "title": os.path.basename(pdf_path),
+            "sections": split_by_headings(raw_text, page_starts, page_numbers),
+            "extraction_method": method,
+            "num_pages": len(pages),
+            "page_backends": report["page_backends"],
+            "backend_timings": report["backend_timings"]
+        }
+        span.set(pages=len(pages), method=method)
+        metrics.increment("extract.pages_parsed", len(pages))
+        key = _parse_cache_key(pdf_path, strategy) if use_cache and raw_text.strip() else None
+        if key:
+            parse_cache.put(key, result)
+        return result
+
+def _page_at(offset, page_starts, page_numbers):
+    return page_numbers[max(bisect_right(page_starts, offset) - 1, 0)]
+
+def heading_title(line):
+    # Returns the normalized title if a stripped line looks like a section
+    # heading ("RESULTS", "3.2 Method", "IV. DISCUSSION"), else None.
+    if len(line) > MAX_HEADING_CHARS:
+        return None
+    if _CAPS_HEADING.fullmatch(line):
+        if " " not in line and "\t" not in line and line.rstrip(":") not in SECTION_WORDS:
+            return None
+        if line.split(None, 1)[0].rstrip(".:") in CAPTION_WORDS:
+            return None
+        return line if _FOUR_LETTERS.match(line) else None
+    match = _NUMBERED_HEADING.fullmatch(line)
+    if not match:
+        return None
+    number, title = match.groups()
+    words = title.split()
+    # Rejects affiliations, footnotes and wrapped body lines that happen to
+    # start with a number ("1 Physics Department, ...", "10 K, the ..."),
+    # captions, math, and axis ticks or legend entries ("0.5", "1.04",
+    # "31 Rod array") that no section is numbered with.
+    if (len(words) > MAX_HEADING_WORDS or len(words[0]) < 3 or not "A" <= title[0] <= "Z"
+            or title[-1] in ".,;:" or "," in title or "=" in title
+            or words[0].rstrip(".").upper() in CAPTION_WORDS):
+        return None
+    parts = number.rstrip(".").split(".")
+    if number[0] not in "IVX" and (int(parts[0]) > MAX_SECTION_NUMBER or any(p.startswith("0") for p in parts)):
+        return None
+    # Roman numerals only count with an all-caps title, otherwise author
+    # initials like "V. B. Verma" would qualify.
+    if number[0] in "IVX" and not title.isupper():
+        return None
+    return f"{number} {title}"
+
+def _drop_empty_runs(text, headings):
+    # Headings in a long run with next to no text between them are rows of a
+    # table; their lines stay in the section before the run.
+    ends = [h[1] for h in headings[1:]] + [len(text)]
+    short = [len(text[content_start:end].strip()) < MIN_SECTION_CHARS
+             for (_, _, content_start), end in zip(headings, ends)]
+    kept = []
+    i = 0
+    while i < len(headings):
+        j = i
+        while j < len(headings) and short[j]:
+            j += 1
+        if j - i >= MAX_EMPTY_RUN:
+            i = j
+            continue
+        kept.extend(headings[i:j + 1])
+        i = j + 1
+    return kept
+
+@metrics.traced("extract.headings")
+def split_by_headings(text, page_starts=None, page_numbers=None):
+    if page_starts and page_numbers is None:
+        page_numbers = list(range(1, len(page_starts) + 1))
+    # (title, heading_start, content_start)
+    headings = []
+    for match in _HEADING_CANDIDATE.finditer(text):
+        candidate = match.group(1)
+        start = match.start()
+        two_lines = "\n" in candidate
+        if two_lines:
+            candidate = " ".join(part.strip() for part in candidate.split("\n"))
+        title = heading_title(candidate.strip())
+        if title is None and two_lines:
+            # The number was a page number or tick label; the line after it
+            # may still be a heading of its own.
+            start = match.start(1) + match.group(1).index("\n") + 1
+            title = heading_title(text[start:match.end()].strip())
+        if title is None:
+            continue
+        content_start = min(match.end() + 1, len(text))
+        if (headings and not _NON_BLANK.search(text, headings[-1][2], start)
+                and len(headings[-1][0]) + len(title) < MAX_HEADING_CHARS):
+            # A heading wrapped over two lines.
+            headings[-1] = (f"{headings[-1][0]} {title}", headings[-1][1], content_start)
+        else:
+            headings.append((title, start, content_start))
+
+    headings = _drop_empty_runs(text, headings)
     results = []
-    for i in range(1, len(sections), 2):
-        results.append({
-            "section_title": sections[i].strip(),
-            "content": sections[i+1].strip()
-        })
+    # Text before the first heading is usually the title block and abstract.
+    preamble_end = headings[0][1] if headings else len(text)
+    if text[:preamble_end].strip():
+        headings.insert(0, (PREAMBLE_TITLE, 0, 0))
+    for i, (title, start, content_start) in enumerate(headings):
+        end = headings[i + 1][1] if i + 1 < len(headings) else len(text)
+        section = {
+            "section_title": title,
+            "content": text[content_start:end].strip()
+        }
+        if page_starts:
+            section["page"] = _page_at(start, page_starts, page_numbers)
+            section["page_end"] = _page_at(max(end - 1, start), page_starts, page_numbers)
+        results.append(section)
     return results
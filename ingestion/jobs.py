@@ -0,0 +1,110 @@
+import os
+import time
+from ingestion.chunker import MIN_CHUNK_CHARS, section_to_documents
+from ingestion.parallel import parse_pdfs
+from ingestion.preview import get_preview
+from rag.vector_store import create_or_load_vectorstore
+from utils import metrics
+
+
+class IngestJob:
+    # Parses and indexes a set of papers on a worker thread. The job object
+    # outlives the Streamlit rerun that started it, so widget interactions
+    # never restart or cancel ingestion; the UI only reads its fields.
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.key = job_key(self.paths)
+        self.total = len(self.paths)
+        self.parsed = 0
+        self.stage = "queued"
+        self.current = None
+        self.sections = []
+        self.section_docs = []
+        self.extraction_methods = set()
+        self.errors = {}
+        self.error = None
+        self.vectordb = None
+        self.started = None
+        self.finished = None
+        self.future = None
+
+    @property
+    def ready(self):
+        return self.stage == "ready"
+
+    @property
+    def failed(self):
+        return self.stage == "failed"
+
+    @property
+    def elapsed(self):
+        return ((self.finished or time.perf_counter()) - self.started) if self.started else 0.0
+
+    def run(self):
+        # Runs on an executor thread, so this is the root of its own trace.
+        with metrics.span("ingest", papers=self.total):
+            self._run()
+
+    def _run(self):
+        self.started = time.perf_counter()
+        try:
+            self.stage = "parsing"
+            parsed = {}
+            # Papers parsed in worker processes only show up here as a whole;
+            # their extract.* spans stay in the worker.
+            with metrics.span("ingest.parse"):
+                for path, paper_json, error in parse_pdfs(self.paths):
+                    if error is not None:
+                        self.errors[path] = str(error)
+                        paper_json = {"sections": [], "extraction_method": "failed"}
+                    title = paper_json.get("title", os.path.basename(path))
+                    # Tag each section with its source
+                    for s in paper_json.get("sections", []):
+                        s["source"] = title
+                    parsed[path] = paper_json
+                    get_preview(path)
+                    self.current = path
+                    self.parsed += 1
+            sections = []
+            for path in self.paths:
+                self.extraction_methods.add(parsed[path].get("extraction_method", "unknown"))
+                sections.extend(parsed[path].get("sections", []))
+            with metrics.span("chunk", sections=len(sections)):
+                section_docs = [section_to_documents(s, s["source"]) for s in sections]
+            metrics.increment("chunk.chunks", sum(len(d) for d in section_docs))
+
+            self.stage = "indexing"
+            docs = [
+                d for s, section in zip(section_docs, sections)
+                if len(section["content"].strip()) > MIN_CHUNK_CHARS for d in s
+            ]
+            if docs:
+                # Sets metadata["chunk_id"] on every doc, which scope_filter uses.
+                self.vectordb = create_or_load_vectorstore(docs)
+            self.sections = sections
+            self.section_docs = section_docs
+            self.stage = "ready"
+        except Exception as e:
+            self.error = e
+            self.stage = "failed"
+            print("Ingestion failed:", e)
+        finally:
+            self.finished = time.perf_counter()
+
+
+def job_key(paths):
+    # A re-uploaded file with the same name is a different job.
+    key = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            key.append((path, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            key.append((path, None, None))
+    return tuple(key)
+
+
+def start_ingest(executor, paths):
+    job = IngestJob(paths)
+    job.future = executor.submit(job.run)
+    return job
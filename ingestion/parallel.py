@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from ingestion.extractor import get_cached_parse, parse_pdf_to_json
+
+PARSE_TIMEOUT = 120  # seconds per file, measured from when a worker picks it up
+
+
+def _register_worker(pids):
+    pids.put(os.getpid())
+
+
+class ParsePool:
+    # Process pool for parsing PDFs, safe to call from several threads. A
+    # worker wedged inside a PDF library never returns on its own, and one
+    # that crashes breaks the whole executor, so run() replaces the executor
+    # in both cases instead of failing every file after it. spawn, not fork:
+    # the Streamlit server is multi-threaded.
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._free = threading.Condition()
+        self._busy = 0
+        self._generation = 0
+        self._killed = set()  # generations replaced because of a timeout
+        self._start()
+
+    def _start(self):
+        context = multiprocessing.get_context("spawn")
+        self._pids = context.SimpleQueue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=context, initializer=_register_worker, initargs=(self._pids,)
+        )
+        self._generation += 1
+
+    def _shutdown(self, kill):
+        # kill terminates the workers instead of waiting for them.
+        self._executor.shutdown(wait=not kill, cancel_futures=True)
+        if not kill:
+            return
+        pids = set()
+        while not self._pids.empty():
+            pids.add(self._pids.get())
+        for process in multiprocessing.active_children():
+            if process.pid in pids:
+                process.terminate()
+
+    def _restart(self, generation, killed=False):
+        # Replaces the executor unless another call already has. Returns
+        # whether that generation was killed over a timeout.
+        with self._free:
+            if generation == self._generation:
+                self._shutdown(kill=True)
+                if killed:
+                    self._killed.add(generation)
+                self._start()
+            return generation in self._killed
+
+    def run(self, fn, *args, timeout=PARSE_TIMEOUT, **kwargs):
+        # Runs fn in a worker and returns its result. A call waits for a free
+        # worker before it is submitted, so the timeout counts parsing, not
+        # time queued behind other files. A timeout replaces the executor to
+        # get rid of the wedged worker; calls that lose their worker to that
+        # are run again. After a crash every call that was running is retried
+        # alone, so only the file that really kills a worker fails.
+        alone = False
+        while True:
+            slots = self.max_workers if alone else 1
+            with self._free:
+                while self._busy + slots > self.max_workers:
+                    self._free.wait()
+                self._busy += slots
+                generation, executor = self._generation, self._executor
+            future = None
+            try:
+                future = executor.submit(fn, *args, **kwargs)
+                return future.result(timeout=timeout)
+            except FutureTimeoutError:
+                self._restart(generation, killed=True)
+                raise TimeoutError(f"Parsing took longer than {timeout}s") from None
+            except (BrokenProcessPool, CancelledError):
+                if self._restart(generation):
+                    continue
+                if alone:
+                    raise
+                alone = True
+            except RuntimeError:
+                # submit() on an executor another call has just replaced.
+                if future is not None or generation == self._generation:
+                    raise
+            finally:
+                with self._free:
+                    self._busy -= slots
+                    self._free.notify_all()
+
+    def close(self, kill=False):
+        with self._free:
+            self._shutdown(kill)
+
+
+def parse_pdfs(paths, max_workers=None, timeout=PARSE_TIMEOUT):
+    # Yields (path, paper_json, error) in completion order. Cached papers come
+    # back immediately; a file that raises, times out or crashes its worker
+    # yields its error instead of stopping the batch.
+    pending_paths = []
+    for path in paths:
+        try:
+            cached = get_cached_parse(path)
+        except Exception as e:
+            cached = None
+            print("Parse cache lookup failed:", e)
+        if cached is not None:
+            yield path, cached, None
+        else:
+            pending_paths.append(path)
+    if not pending_paths:
+        return
+
+    requested = max_workers or os.cpu_count() or 1
+    max_workers = max(1, min(requested, len(pending_paths)))
+    # A lone long PDF still benefits from the spare cores, page by page.
+    page_workers = requested if len(pending_paths) == 1 else 1
+    pool = ParsePool(max_workers)
+    callers = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            callers.submit(pool.run, parse_pdf_to_json, path, timeout=timeout, page_workers=page_workers): path
+            for path in pending_paths
+        }
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+    finally:
+        pool.close()
+        callers.shutdown(cancel_futures=True)
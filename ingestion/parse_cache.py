@@ -0,0 +1,86 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+CACHE_DIR = os.path.join("data", "parse_cache")
+MAX_MEMORY_ENTRIES = 32
+
+_memory = OrderedDict()
+_digests = {}
+_lock = threading.Lock()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    # Re-hashing a 20 MB PDF on every rerun is wasteful; reuse the digest
+    # while size and mtime are unchanged.
+    stat = os.stat(path)
+    stamp = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        digest = _digests.get(stamp)
+    if digest:
+        return digest
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    with _lock:
+        _digests[stamp] = digest
+    return digest
+
+
+def cache_key(digest, version, method):
+    return f"{digest}-v{version}-{method}"
+
+
+def _cache_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def _remember(key, value):
+    with _lock:
+        _memory[key] = value
+        _memory.move_to_end(key)
+        while len(_memory) > MAX_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def get(key, cache_dir=CACHE_DIR):
+    with _lock:
+        value = _memory.get(key)
+        if value is not None:
+            _memory.move_to_end(key)
+    if value is None:
+        path = _cache_path(key, cache_dir)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _remember(key, value)
+    # Callers tag sections in place (e.g. app.py sets "source"), so never
+    # hand out the cached object itself.
+    return copy.deepcopy(value)
+
+
+def put(key, value, cache_dir=CACHE_DIR):
+    value = copy.deepcopy(value)
+    _remember(key, value)
+    path = _cache_path(key, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print("Could not write parse cache:", e)
+
+
+def clear_memory():
+    with _lock:
+        _memory.clear()
+        _digests.clear()
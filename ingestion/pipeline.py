@@ -0,0 +1,221 @@
+import os
+import queue
+import threading
+import time
+from ingestion.arxiv_fetcher import download_latest_papers
+from ingestion.chunker import json_to_documents
+from ingestion.extractor import get_cached_parse, parse_pdf_to_json
+from ingestion.parallel import ParsePool
+from ingestion.preview import get_preview
+from rag.vector_store import chunk_id, create_or_load_vectorstore
+
+# Items allowed to wait between two stages. A full queue blocks the stage
+# upstream of it, so a slow indexer holds back parsing and parsing holds
+# back downloads instead of buffering the whole library in memory.
+QUEUE_SIZE = 8
+# Chunks per create_or_load_vectorstore call when the indexer is behind.
+INDEX_BATCH_CHUNKS = 256
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0     # summed over workers
+        self.blocked = 0.0  # waiting on a full downstream queue
+        self.errors = 0
+        self.started = None
+        self.finished = None
+        self.max_queue = 0
+        self._lock = threading.Lock()
+
+    def add(self, **amounts):
+        with self._lock:
+            for key, amount in amounts.items():
+                setattr(self, key, getattr(self, key) + amount)
+
+    def report(self):
+        wall = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "errors": self.errors,
+            "wall_s": wall,
+            "busy_s": self.busy,
+            "blocked_s": self.blocked,
+            "utilization": self.busy / (wall * self.workers) if wall > 0 else 0.0,
+            "items_per_s": self.items_out / wall if wall > 0 else 0.0,
+            "max_queue": self.max_queue,
+        }
+
+
+def _put(outbox, item, stats):
+    start = time.perf_counter()
+    outbox.put(item)
+    stats.add(blocked=time.perf_counter() - start, items_out=1)
+    stats.max_queue = max(stats.max_queue, outbox.qsize())
+
+
+def _start_stage(name, fn, inbox, outbox, workers, stats):
+    # fn(item) returns an iterable of items for the next stage. The last
+    # worker to see _DONE passes it on downstream.
+    remaining = [workers]
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    stats.finished = time.perf_counter()
+                    outbox.put(_DONE)
+                return
+            if stats.started is None:
+                stats.started = time.perf_counter()
+            stats.add(items_in=1)
+            start = time.perf_counter()
+            try:
+                results = list(fn(item))
+            except Exception as e:
+                stats.add(errors=1, busy=time.perf_counter() - start)
+                print(f"{name} failed for {item if isinstance(item, str) else type(item).__name__}: {e}")
+                continue
+            stats.add(busy=time.perf_counter() - start)
+            for result in results:
+                _put(outbox, result, stats)
+
+    threads = [threading.Thread(target=work, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run_pipeline(paths=None, query=None, max_results=10, save_dir="data/papers", parse_workers=None,
+                 queue_size=QUEUE_SIZE, index_batch=INDEX_BATCH_CHUNKS, index=create_or_load_vectorstore):
+    # fetch -> parse -> chunk -> index, each stage on its own threads and
+    # joined by bounded queues, so the first paper can be embedded while later
+    # ones are still downloading. Give either local paths or an arXiv query.
+    # Returns a report with per-stage throughput and, under "indexed", the
+    # page and chunk counts and chunk IDs of every paper that made it into
+    # the index.
+    parse_workers = parse_workers or os.cpu_count() or 1
+    to_parse = queue.Queue(queue_size)
+    to_chunk = queue.Queue(queue_size)
+    to_index = queue.Queue(queue_size)
+    indexed = queue.Queue()
+    fetch_stats = StageStats("fetch")
+    parse_stats = StageStats("parse", parse_workers)
+    chunk_stats = StageStats("chunk")
+    index_stats = StageStats("index")
+    counts = {"pages": 0}
+    # Even a single worker parses out of process, for the timeout and so a
+    # PDF that crashes its parser cannot take the pipeline down.
+    pool = ParsePool(parse_workers)
+
+    def parse(path):
+        # The first-page preview is cheap and saves the app from opening the
+        # PDF just to show it.
+        get_preview(path)
+        paper_json = get_cached_parse(path)
+        if paper_json is None:
+            paper_json = pool.run(parse_pdf_to_json, path)
+        return [(path, paper_json)]
+
+    def chunk(item):
+        path, paper_json = item
+        pages = paper_json.get("num_pages") or 0
+        counts["pages"] += pages
+        return [(path, pages, json_to_documents(paper_json))]
+
+    pending = []
+    pending_papers = []
+    indexed_papers = {}
+
+    def flush():
+        # A failed batch is dropped, and its papers are left out of "indexed".
+        # Errors are handled here rather than by the stage, so the last flush
+        # after the threads finish is covered too.
+        batch, papers = list(pending), list(pending_papers)
+        pending.clear()
+        pending_papers.clear()
+        if batch:
+            try:
+                index(batch)
+            except Exception as e:
+                index_stats.add(errors=1)
+                print(f"index failed for {len(papers)} papers ({len(batch)} chunks): {e}")
+                return
+            index_stats.add(items_out=len(batch))
+        for path, pages, docs in papers:
+            chunk_ids = list(dict.fromkeys(chunk_id(doc) for doc in docs))
+            indexed_papers[path] = {"pages": pages, "chunks": len(docs), "chunk_ids": chunk_ids}
+
+    def index_batch_or_wait(item):
+        # Batch while the chunker is ahead; flush as soon as it catches up.
+        path, pages, docs = item
+        pending.extend(docs)
+        pending_papers.append((path, pages, docs))
+        if len(pending) >= index_batch or to_index.empty():
+            flush()
+        return ()
+
+    def fetch():
+        fetch_stats.started = time.perf_counter()
+        try:
+            if query is not None:
+                download_latest_papers(
+                    query, max_results, save_dir, on_download=lambda path: _put(to_parse, path, fetch_stats)
+                )
+            for path in paths or ():
+                _put(to_parse, path, fetch_stats)
+        except Exception as e:
+            fetch_stats.add(errors=1)
+            print(f"fetch failed: {e}")
+        finally:
+            fetch_stats.finished = time.perf_counter()
+            to_parse.put(_DONE)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=fetch, name="fetch", daemon=True)]
+    threads[0].start()
+    threads += _start_stage("parse", parse, to_parse, to_chunk, parse_workers, parse_stats)
+    threads += _start_stage("chunk", chunk, to_chunk, to_index, 1, chunk_stats)
+    threads += _start_stage("index", index_batch_or_wait, to_index, indexed, 1, index_stats)
+    try:
+        for thread in threads:
+            thread.join()
+        flush()
+    finally:
+        pool.close()
+    index_stats.finished = time.perf_counter()
+    wall = time.perf_counter() - start
+    return {
+        "papers": chunk_stats.items_out,
+        "pages": counts["pages"],
+        "chunks": index_stats.items_out,
+        "indexed": indexed_papers,
+        "wall_s": wall,
+        "stages": [s.report() for s in (fetch_stats, parse_stats, chunk_stats, index_stats)],
+    }
+
+
+def format_report(report):
+    lines = [
+        f"{report['papers']} papers, {report['pages']} pages, {report['chunks']} chunks in {report['wall_s']:.1f}s"
+    ]
+    for s in report["stages"]:
+        lines.append(
+            f"  {s['stage']:<6} x{s['workers']:<3} {s['items_out']:>5} out  {s['items_per_s']:7.2f}/s"
+            f"  busy {s['utilization']:4.0%}  blocked {s['blocked_s']:6.2f}s  errors {s['errors']}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,61 @@
+import os
+from ingestion import parse_cache
+
+PREVIEW_DIR = os.path.join("data", "previews")
+PREVIEW_VERSION = 1
+PREVIEW_CHARS = 800
+THUMBNAIL_WIDTH = 180  # pixels
+
+
+def _thumbnail_path(key, cache_dir):
+    return os.path.join(cache_dir, key[:2], f"{key}.png")
+
+
+def _first_page(pdf_path, thumbnail_path):
+    # Opens only the first page. PyMuPDF also renders the thumbnail; without
+    # it the preview falls back to pdfplumber text and has no image.
+    try:
+        try:
+            import pymupdf
+        except ImportError:
+            import fitz as pymupdf  # PyMuPDF < 1.24.3
+    except ImportError:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            text = pdf.pages[0].extract_text() if pdf.pages else None
+            return text, len(pdf.pages), (pdf.metadata or {}).get("Title"), None
+    with pymupdf.open(pdf_path) as doc:
+        if not doc.page_count:
+            return None, 0, None, None
+        page = doc[0]
+        text = page.get_text()
+        zoom = THUMBNAIL_WIDTH / max(page.rect.width, 1)
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom)).save(thumbnail_path)
+        return text, doc.page_count, (doc.metadata or {}).get("title"), thumbnail_path
+
+
+def get_preview(pdf_path, cache_dir=PREVIEW_DIR):
+    # First-page text, page count, title, size and thumbnail path for one PDF,
+    # cached by content hash so a rerun never reopens the file.
+    digest = parse_cache.file_sha256(pdf_path)
+    key = parse_cache.cache_key(digest, PREVIEW_VERSION, "preview")
+    preview = parse_cache.get(key, cache_dir)
+    if preview is not None:
+        return preview
+    try:
+        text, num_pages, title, thumbnail = _first_page(pdf_path, _thumbnail_path(key, cache_dir))
+    except Exception as e:
+        print("Preview failed:", e)
+        return {"text": "(Preview unavailable)", "num_pages": None, "title": None,
+                "size": os.path.getsize(pdf_path), "thumbnail": None}
+    text = (text or "").strip()
+    preview = {
+        "text": text[:PREVIEW_CHARS] + ("..." if len(text) > PREVIEW_CHARS else "") if text else "(No extractable text)",
+        "num_pages": num_pages,
+        "title": title or None,
+        "size": os.path.getsize(pdf_path),
+        "thumbnail": thumbnail,
+    }
+    parse_cache.put(key, preview, cache_dir)
+    return preview
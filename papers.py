@@ -1,34 +1,18 @@
-import arxiv
-import os
 import time
+from ingestion.arxiv_fetcher import download_latest_papers
 
 # Create a directory to save the PDFs
 download_dir = "./papers"
-if not os.path.exists(download_dir):
-    os.makedirs(download_dir)
 
-# Define a search query for papers with "machine learning" in the title
-# We'll set a max_results to avoid downloading too many papers at once.
-search = arxiv.Search(
-    # Use the 'OR' operator to search for any of the keywords in the title.
+# Downloads run in parallel behind a token-bucket rate limiter (about one
+# request every three seconds, as arXiv asks), so no sleep between papers is
+# needed. Papers already in download_dir are skipped and interrupted
+# downloads resume where they stopped.
+start = time.perf_counter()
+paths = download_latest_papers(
     query='stealth materials',
-    max_results=100,  # Limit to 5 papers for this example
-    sort_by=arxiv.SortCriterion.SubmittedDate
+    max_results=100,
+    save_dir=download_dir,
+    on_download=lambda path: print(f"Downloaded {path}"),
 )
-
-# Get the client
-client = arxiv.Client()
-
-# Iterate through the search results and download each PDF
-for paper in client.results(search):
-    try:
-        print(f"Downloading PDF for '{paper.title}'...")
-        paper.download_pdf(dirpath=download_dir)
-        print("Download successful.")
-        
-        # IMPORTANT: Respect the rate limit
-        # The arxiv.py library's default client has a delay, but it's
-        # good practice to add your own just in case.
-        time.sleep(3) # Wait for 3 seconds before the next request
-    except Exception as e:
-        print(f"Could not download '{paper.title}': {e}")
\ No newline at end of file
+print(f"{len(paths)} papers in {download_dir} after {time.perf_counter() - start:.1f}s")
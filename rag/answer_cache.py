@@ -0,0 +1,109 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+MAX_ENTRIES = 256
+TTL_SECONDS = 24 * 3600
+# Cosine similarity above which two questions over the same scope are treated
+# as the same question.
+SIMILARITY_THRESHOLD = 0.95
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize_question(question):
+    return " ".join(_WORD.findall(question.lower()))
+
+
+def scope_key(chunk_ids):
+    return hashlib.sha256("\n".join(sorted(set(chunk_ids))).encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, embeddings=None, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, threshold=SIMILARITY_THRESHOLD):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        # (persona, scope, normalized question) -> (answer, unit vector or None, created)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now):
+        expired = [k for k, (_, _, created) in self._entries.items() if now - created > self.ttl]
+        for k in expired:
+            del self._entries[k]
+
+    def _vector(self, question):
+        if self.embeddings is None:
+            return None
+        v = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    def get(self, persona, chunk_ids, question):
+        scope = scope_key(chunk_ids)
+        key = (persona, scope, normalize_question(question))
+        with self._lock:
+            self._evict_expired(time.time())
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            candidates = [
+                (k, vector) for k, (_, vector, _) in self._entries.items()
+                if k[0] == persona and k[1] == scope and vector is not None
+            ]
+        if candidates:
+            query = self._vector(question)
+            if query is not None:
+                scores = np.stack([v for _, v in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    with self._lock:
+                        entry = self._entries.get(candidates[best][0])
+                        if entry is not None:
+                            self._entries.move_to_end(candidates[best][0])
+                            self.near_hits += 1
+                            return entry[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, persona, chunk_ids, question, answer):
+        key = (persona, scope_key(chunk_ids), normalize_question(question))
+        vector = self._vector(question)
+        with self._lock:
+            self._entries[key] = (answer, vector, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+
+
+def get_answer_cache(embeddings=None):
+    global _cache
+    if _cache is None:
+        _cache = AnswerCache(embeddings)
+    elif _cache.embeddings is None:
+        _cache.embeddings = embeddings
+    return _cache
@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+import os
+import time
+from langchain_core.runnables import RunnableLambda
+from rag.chain import _chunk_text, get_llm
+from rag.context import PromptTokenCounter, citation, pack_context
+from rag.retrieval import FETCH_K, K, LAMBDA_MULT, RETRIEVAL_MODE, HybridRetriever
+from rag.vector_store import lexical_index
+from utils import metrics
+from utils.prompts import get_context_budget, get_persona_prompt
+
+# Generation requests in flight at once; Gemini rate limits, not the app,
+# are what bound this.
+MAX_CONCURRENCY = 4
+RESULT_FIELDS = [
+    "question", "answer", "sources", "retrieval_ms", "generation_ms", "latency_ms", "prompt_tokens", "error",
+]
+
+
+def parse_questions(text, fmt=".txt"):
+    # One question per line for .txt; a "question" column (or the first
+    # column) for .csv; a "question" field per line for .jsonl.
+    fmt = fmt.lower()
+    if fmt == ".csv":
+        rows = list(csv.reader(io.StringIO(text)))
+        if rows and "question" in [c.strip().lower() for c in rows[0]]:
+            column = [c.strip().lower() for c in rows[0]].index("question")
+            rows = rows[1:]
+        else:
+            column = 0
+        questions = [row[column] for row in rows if len(row) > column]
+    elif fmt == ".jsonl":
+        questions = [json.loads(line)["question"] for line in text.splitlines() if line.strip()]
+    else:
+        questions = text.splitlines()
+    return [q.strip() for q in questions if q.strip()]
+
+
+def read_questions(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_questions(f.read(), os.path.splitext(path)[1])
+
+
+def _generate(chain, payload):
+    stats = {}
+    start = time.perf_counter()
+    message = chain.invoke(payload, config={"callbacks": [PromptTokenCounter(stats)]})
+    stats["generation_ms"] = (time.perf_counter() - start) * 1000
+    metrics.observe("batch.generate", stats["generation_ms"] / 1000)
+    return _chunk_text(message), stats
+
+
+def answer_questions(vectordb, questions, persona="default", search_filter=None, llm=None,
+                     max_concurrency=MAX_CONCURRENCY, k=K, fetch_k=FETCH_K, lambda_mult=LAMBDA_MULT,
+                     retrieval_mode=RETRIEVAL_MODE, context_budget=None):
+    # Answers a list of questions over one index. Retrieval runs once for the
+    # whole list (one embedding call, one vectorized candidate fetch), then
+    # generation goes through Runnable.batch with at most max_concurrency
+    # requests in flight. A failed question gets its error in the row instead
+    # of stopping the rest. Returns one row per question, in order.
+    if not questions:
+        return []
+    llm = llm or get_llm()
+    context_budget = context_budget or get_context_budget(persona)
+    retriever = HybridRetriever(
+        vectorstore=vectordb, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=search_filter,
+        lexical_index=lexical_index(vectordb), mode=retrieval_mode
+    )
+    with metrics.span("batch", questions=len(questions), persona=persona):
+        start = time.perf_counter()
+        doc_lists = retriever.retrieve_batch(questions)
+        contexts = [pack_context(docs, context_budget)[0] for docs in doc_lists]
+        # Retrieval is one pass for the batch, so each question is charged an
+        # equal share of it.
+        retrieval_ms = (time.perf_counter() - start) * 1000 / max(len(questions), 1)
+
+        chain = get_persona_prompt(persona) | llm
+        payloads = [{"context": context, "input": q, "history": ""} for q, context in zip(questions, contexts)]
+        outputs = RunnableLambda(lambda payload: _generate(chain, payload)).batch(
+            payloads, config={"max_concurrency": max_concurrency}, return_exceptions=True
+        )
+
+    rows = []
+    for question, docs, output in zip(questions, doc_lists, outputs):
+        row = {
+            "question": question,
+            "answer": "",
+            "sources": "; ".join(dict.fromkeys(citation(d.metadata) for d in docs)),
+            "retrieval_ms": round(retrieval_ms, 1),
+            "generation_ms": None,
+            "latency_ms": None,
+            "prompt_tokens": None,
+            "error": "",
+        }
+        if isinstance(output, Exception):
+            row["error"] = f"{type(output).__name__}: {output}"
+            metrics.increment("batch.errors")
+        else:
+            answer, stats = output
+            row["answer"] = answer
+            row["generation_ms"] = round(stats["generation_ms"], 1)
+            row["latency_ms"] = round(retrieval_ms + stats["generation_ms"], 1)
+            row["prompt_tokens"] = stats.get("input_tokens") or stats.get("prompt_tokens")
+        rows.append(row)
+    return rows
+
+
+def to_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def to_jsonl(rows):
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def write_results(rows, path):
+    # JSONL for a .jsonl path, CSV otherwise.
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(to_jsonl(rows) if path.endswith(".jsonl") else to_csv(rows))
+
+
+def format_summary(rows, wall_s):
+    answered = [r for r in rows if not r["error"]]
+    latencies = sorted(r["latency_ms"] for r in answered)
+    summary = f"{len(answered)}/{len(rows)} questions answered in {wall_s:.1f}s"
+    if latencies:
+        summary += (
+            f" ({len(rows) / (wall_s or float('inf')):.1f} questions/s); per-question latency"
+            f" p50 {latencies[len(latencies) // 2]:.0f} ms, max {latencies[-1]:.0f} ms"
+        )
+    return summary
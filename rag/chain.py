@@ -1,22 +1,123 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.runnables import RunnableMap, RunnablePassthrough
-from utils.prompts import get_persona_prompt
-from rag.memory import get_chat_memory
+import json
+import time
+from operator import itemgetter
+from collections import OrderedDict
+from functools import lru_cache
+from langchain_core.runnables import RunnableLambda, RunnableMap
+from utils.prompts import get_context_budget, get_persona_prompt
+from rag.context import PromptTokenCounter, context_packer
+from rag.vector_store import index_version, lexical_index
+from rag.retrieval import FETCH_K, K, LAMBDA_MULT, RETRIEVAL_MODE, HybridRetriever
+from utils import metrics
+
+LLM_MODEL = "models/gemini-1.5-flash"
+MAX_CACHED_CHAINS = 32
+
+_chains = OrderedDict()
 
-def build_rag_chain(vectordb, persona="default"):
-    retriever = vectordb.as_retriever(search_type="mmr", k=4)
-    prompt = get_persona_prompt(persona)
-    memory = get_chat_memory()
 
-    llm = ChatGoogleGenerativeAI(
-        model="models/gemini-1.5-flash",
-        temperature=0.4,
+@lru_cache(maxsize=None)
+def get_llm(model=LLM_MODEL, temperature=0.4):
+    # One client per process: its HTTP/gRPC transport and connection pool are
+    # reused by every question instead of being rebuilt per chain.
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
         model_kwargs={"streaming": True}
     )
 
-    chain = RunnableMap({
-        "context": retriever,
-        "input": RunnablePassthrough()
+
+def _chain_key(vectordb, persona, search_filter, llm, *retrieval):
+    return (
+        persona,
+        id(vectordb),
+        index_version(vectordb),
+        json.dumps(search_filter, sort_keys=True),
+        id(llm),
+        *retrieval,
+    )
+
+
+def _chain_input(value):
+    # A plain question string still works. With memory, the input is a dict
+    # holding the question as asked, the standalone query used for retrieval
+    # and the conversation history.
+    if isinstance(value, str):
+        return {"input": value, "query": value, "history": ""}
+    return {"input": value["input"], "query": value.get("query") or value["input"], "history": value.get("history", "")}
+
+
+def build_rag_chain(vectordb, persona="default", search_filter=None, llm=None,
+                    k=K, fetch_k=FETCH_K, lambda_mult=LAMBDA_MULT, retrieval_mode=RETRIEVAL_MODE,
+                    context_budget=None):
+    llm = llm or get_llm()
+    context_budget = context_budget or get_context_budget(persona)
+    key = _chain_key(
+        vectordb, persona, search_filter, llm, k, fetch_k, lambda_mult, retrieval_mode, context_budget
+    )
+    chain = _chains.get(key)
+    if chain is not None:
+        _chains.move_to_end(key)
+        metrics.increment("chain.cache_hits")
+        return chain
+    metrics.increment("chain.builds")
+
+    retriever = HybridRetriever(
+        vectorstore=vectordb, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=search_filter,
+        lexical_index=lexical_index(vectordb), mode=retrieval_mode
+    )
+    prompt = get_persona_prompt(persona)
+
+    # Retrieved chunks are packed into cited plain text under the persona's
+    # token budget before they reach the prompt.
+    chain = RunnableLambda(_chain_input) | RunnableMap({
+        "context": itemgetter("query") | retriever | RunnableLambda(context_packer(context_budget)).with_config(run_name="pack_context"),
+        "input": itemgetter("input"),
+        "history": itemgetter("history"),
     }) | prompt | llm
 
+    _chains[key] = chain
+    while len(_chains) > MAX_CACHED_CHAINS:
+        _chains.popitem(last=False)
     return chain
+
+
+def _chunk_text(chunk):
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, str):
+        return content
+    # Some providers stream a list of content parts.
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+
+
+def stream_answer(chain, question, stats=None, memory=None):
+    # Yields answer text as it is generated. stats (if given) receives
+    # time-to-first-token and total latency in seconds, and the prompt size
+    # in tokens. With a rag.memory.ConversationMemory the question is
+    # condensed against the history first and the turn is recorded after.
+    stats = {} if stats is None else stats
+    with metrics.span("answer") as span:
+        start = time.perf_counter()
+        payload = question
+        if memory is not None:
+            payload = memory.chain_input(question)
+            stats["condense"] = time.perf_counter() - start
+            stats["query"] = payload["query"]
+        # Retrieval and packing run inside the stream and nest under this
+        # span; what is left of it is generation.
+        answer = []
+        for chunk in chain.stream(payload, config={"callbacks": [PromptTokenCounter(stats)]}):
+            text = _chunk_text(chunk)
+            if not text:
+                continue
+            if "ttft" not in stats:
+                stats["ttft"] = time.perf_counter() - start
+                metrics.observe("answer.ttft", stats["ttft"])
+            answer.append(text)
+            yield text
+        stats["total"] = time.perf_counter() - start
+        stats.setdefault("ttft", stats["total"])
+        span.set(ttft_ms=round(stats["ttft"] * 1000), prompt_tokens=stats.get("input_tokens") or stats.get("prompt_tokens"))
+        if memory is not None:
+            memory.add_turn(question, "".join(answer))
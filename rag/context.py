@@ -0,0 +1,135 @@
+import logging
+from langchain_core.callbacks import BaseCallbackHandler
+from ingestion.chunker import CHARS_PER_TOKEN, estimate_tokens
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# A chunk cut down to less than this is dropped rather than packed.
+MIN_PACKED_TOKENS = 40
+# Overlaps shorter than this are left alone; they are not worth the scan.
+MIN_OVERLAP_CHARS = 20
+
+
+def citation(metadata):
+    parts = [metadata.get("source") or "unknown source"]
+    if metadata.get("section"):
+        parts.append(metadata["section"])
+    page, page_end = metadata.get("page"), metadata.get("page_end")
+    if page is not None:
+        parts.append(f"p. {page}" if page_end in (None, page) else f"pp. {page}-{page_end}")
+    return " | ".join(parts)
+
+
+def overlap_length(before, after):
+    # Length of the longest suffix of `before` that is also a prefix of
+    # `after`, which is what the chunker's overlap window produces.
+    probe = after[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    pos = before.find(probe, max(0, len(before) - len(after)))
+    while pos != -1:
+        if after.startswith(before[pos:]):
+            return len(before) - pos
+        pos = before.find(probe, pos + 1)
+    return 0
+
+
+def truncate_to_tokens(text, tokens):
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + " …"
+
+
+def pack_context(docs, token_budget):
+    # Formats retrieved chunks (best first) as numbered, cited blocks. Exact
+    # repeats are skipped, the overlap between neighbouring chunks of one
+    # section is sent once, and packing stops at token_budget.
+    kept = {}  # (source, section, chunk) -> text as packed
+    blocks = []
+    used = 0
+    stats = {"retrieved": len(docs), "packed": 0, "duplicates": 0, "overlap_chars": 0, "truncated": 0, "dropped": 0}
+    seen = set()
+    for doc in docs:
+        text = doc.page_content.strip()
+        metadata = doc.metadata
+        key = metadata.get("chunk_id") or text
+        if key in seen:
+            stats["duplicates"] += 1
+            continue
+        seen.add(key)
+        place = (metadata.get("source"), metadata.get("section"), metadata.get("chunk"))
+        if place[2] is not None:
+            previous = kept.get((place[0], place[1], place[2] - 1))
+            if previous:
+                n = overlap_length(previous, text)
+                text = text[n:].lstrip()
+                stats["overlap_chars"] += n
+            following = kept.get((place[0], place[1], place[2] + 1))
+            if following:
+                n = overlap_length(text, following)
+                text = text[:len(text) - n].rstrip()
+                stats["overlap_chars"] += n
+        if not text:
+            stats["duplicates"] += 1
+            continue
+        header = f"[{len(blocks) + 1}] {citation(metadata)}"
+        remaining = token_budget - used - estimate_tokens(header) - 1
+        if remaining < MIN_PACKED_TOKENS:
+            stats["dropped"] += 1
+            continue
+        if estimate_tokens(text) > remaining:
+            text = truncate_to_tokens(text, remaining - 1)
+            stats["truncated"] += 1
+        block = f"{header}\n{text}"
+        blocks.append(block)
+        kept[place] = text
+        used += estimate_tokens(block) + 1
+    stats["packed"] = len(blocks)
+    stats["context_tokens"] = used
+    return "\n\n".join(blocks), stats
+
+
+def context_packer(token_budget):
+    def pack(docs):
+        with metrics.span("pack_context") as span:
+            context, stats = pack_context(docs, token_budget)
+            span.set(chunks=stats["packed"], tokens=stats["context_tokens"])
+        logger.info(
+            "context: %d/%d chunks packed, %d tokens of %d (%d duplicates, %d overlap chars, %d truncated, %d dropped)",
+            stats["packed"], stats["retrieved"], stats["context_tokens"], token_budget,
+            stats["duplicates"], stats["overlap_chars"], stats["truncated"], stats["dropped"],
+        )
+        return context
+    return pack
+
+
+class PromptTokenCounter(BaseCallbackHandler):
+    # Records the size of every prompt that reaches the LLM: an estimate from
+    # the prompt text up front, and the provider's own count if it reports
+    # usage_metadata at the end.
+    def __init__(self, stats=None):
+        self.stats = {} if stats is None else stats
+
+    def _record(self, text):
+        tokens = estimate_tokens(text)
+        self.stats["prompt_tokens"] = tokens
+        metrics.increment("llm.calls")
+        metrics.increment("llm.prompt_tokens", tokens)
+        logger.info("prompt: ~%d tokens", tokens)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._record("".join(str(m.content) for batch in messages for m in batch))
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._record("".join(prompts))
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.stats["input_tokens"] = usage.get("input_tokens")
+                    self.stats["output_tokens"] = usage.get("output_tokens")
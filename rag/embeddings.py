@@ -0,0 +1,170 @@
+import hashlib
+import inspect
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from utils import metrics
+
+EMBEDDING_MODEL = "models/embedding-001"
+CACHE_PATH = os.path.join("data", "embedding_cache.sqlite")
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embedder, model_name, cache_path=CACHE_PATH, batch_size=64, max_concurrency=4):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.hits = 0
+        self.misses = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+        # GoogleGenerativeAIEmbeddings batches queries through embed_documents
+        # with the query task type.
+        self._query_task_type = "task_type" in inspect.signature(embedder.embed_documents).parameters
+        if cache_path != ":memory:":
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+
+    def _lookup(self, hashes):
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        # Stay under SQLite's bound-parameter limit.
+        for start in range(0, len(unique), 500):
+            part = unique[start:start + 500]
+            marks = ",".join("?" * len(part))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({marks})",
+                    [self.model_name, *part],
+                ).fetchall()
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [(self.model_name, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items],
+            )
+            self._conn.commit()
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        metrics.increment("embed.cache_hits", hits)
+        metrics.increment("embed.cache_misses", misses)
+
+    def _embed_batch(self, texts):
+        with self._lock:
+            self.calls += 1
+        # Batches run on pool threads, so they are timed rather than spanned.
+        started = time.perf_counter()
+        vectors = self.embedder.embed_documents(texts)
+        metrics.observe("embed.api_batch", time.perf_counter() - started)
+        return vectors
+
+    def embed_documents(self, texts):
+        with metrics.span("embed.documents", texts=len(texts)) as span:
+            hashes = [text_hash(t) for t in texts]
+            found = self._lookup(hashes)
+            missing = {}
+            for h, t in zip(hashes, texts):
+                if h not in found:
+                    missing.setdefault(h, t)
+            # A text repeated within the call is embedded once, so its
+            # repeats count as hits.
+            self._count(len(texts) - len(missing), len(missing))
+            span.set(misses=len(missing))
+
+            if missing:
+                miss_hashes = list(missing)
+                batches = [miss_hashes[i:i + self.batch_size] for i in range(0, len(miss_hashes), self.batch_size)]
+                workers = max(1, min(self.max_concurrency, len(batches)))
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = pool.map(lambda b: self._embed_batch([missing[h] for h in b]), batches)
+                    for batch, vectors in zip(batches, results):
+                        items = list(zip(batch, vectors))
+                        self._store(items)
+                        found.update(items)
+            return [list(found[h]) for h in hashes]
+
+    def embed_query(self, text):
+        # Queries use a different task type upstream, so they get their own keys.
+        with metrics.span("embed.query") as span:
+            h = "q:" + text_hash(text)
+            found = self._lookup([h])
+            if h in found:
+                self._count(1, 0)
+                span.set(cached=True)
+                return found[h]
+            self._count(0, 1)
+            with self._lock:
+                self.calls += 1
+            vector = self.embedder.embed_query(text)
+            self._store([(h, vector)])
+            return list(vector)
+
+    def _embed_query_batch(self, texts):
+        with self._lock:
+            self.calls += 1
+        if hasattr(self.embedder, "embed_queries"):
+            return self.embedder.embed_queries(texts)
+        if self._query_task_type:
+            return self.embedder.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        return [self.embedder.embed_query(t) for t in texts]
+
+    def embed_queries(self, texts):
+        # embed_query for a whole list of questions: one cache lookup and one
+        # upstream call for the misses.
+        with metrics.span("embed.queries", texts=len(texts)) as span:
+            hashes = ["q:" + text_hash(t) for t in texts]
+            found = self._lookup(hashes)
+            missing = {}
+            for h, t in zip(hashes, texts):
+                if h not in found:
+                    missing.setdefault(h, t)
+            self._count(len(texts) - len(missing), len(missing))
+            span.set(misses=len(missing))
+            if missing:
+                items = list(zip(missing, self._embed_query_batch(list(missing.values()))))
+                self._store(items)
+                found.update(items)
+            return [list(found[h]) for h in hashes]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "calls": self.calls,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def embed_queries(embeddings, texts):
+    # One call for a list of questions where the embeddings support it.
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    return [embeddings.embed_query(t) for t in texts]
+
+
+def get_embeddings(model_name=EMBEDDING_MODEL, cache_path=CACHE_PATH, **kwargs):
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=model_name), model_name, cache_path, **kwargs)
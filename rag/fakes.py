@@ -0,0 +1,39 @@
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class HashEmbeddings(Embeddings):
+    # Deterministic offline stand-in for GoogleGenerativeAIEmbeddings: the same
+    # text always maps to the same unit vector, and every call is counted.
+    def __init__(self, size=768):
+        self.size = size
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        self.texts_embedded += 1
+        return self._vector(text)
+
+    def embed_queries(self, texts):
+        self.calls += 1
+        self.texts_embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+
+def fake_chat_model(responses=None, sleep=None):
+    # Offline stand-in for ChatGoogleGenerativeAI; cycles through responses
+    # and supports .stream() token by token.
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    return FakeListChatModel(responses=responses or ["This is a canned answer."], sleep=sleep)
@@ -0,0 +1,171 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from langchain_core.documents import Document
+from rag.retrieval import compile_filter
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps formulas and identifiers whole: "LaMn2Si2", "SmBaMn2O6", "Fe3GaTe2".
+_TOKEN = re.compile(r"[a-z0-9]+(?:[._-][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this "
+    "to was were what when where which who why with does do did can".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    # Inverted index over chunk Documents keyed by their chunk_id. Adding a
+    # chunk that is already indexed is a no-op, so it can be fed every batch
+    # create_or_load_vectorstore sees. The index keeps term counts and
+    # metadata but no text: with fetch (ids -> Documents, from the vector
+    # store it mirrors) hits are read back from that store. On disk it is one
+    # JSON line per chunk, appended as chunks arrive.
+    def __init__(self, path=None, fetch=None, k1=BM25_K1, b=BM25_B):
+        self.path = path
+        self.fetch = fetch
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)  # term -> {row: term frequency}
+        self._ids = []
+        self._row = {}
+        self._metadatas = []
+        self._texts = {}  # row -> text, only without fetch
+        self._lengths = []
+        self._total_length = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _load(self):
+        intact = True
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Cut short by an interrupted write; nothing after it counts.
+                    intact = False
+                    break
+                self._insert(entry["id"], entry["metadata"], entry["terms"])
+        if not intact:
+            self._rewrite()
+
+    def _insert(self, id_, metadata, terms):
+        row = len(self._ids)
+        for term, tf in terms.items():
+            self._postings[term][row] = tf
+        self._row[id_] = row
+        self._ids.append(id_)
+        self._metadatas.append(metadata)
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        return row
+
+    def _entries(self, rows):
+        # The log lines for rows, rebuilt from the postings.
+        terms = {row: {} for row in rows}
+        for term, postings in self._postings.items():
+            for row, tf in postings.items():
+                if row in terms:
+                    terms[row][term] = tf
+        return [{"id": self._ids[row], "metadata": self._metadatas[row], "terms": terms[row]} for row in rows]
+
+    def _append(self, entries):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+
+    def _rewrite(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in self._entries(range(len(self._ids))))
+        os.replace(tmp_path, self.path)
+
+    def add_documents(self, docs):
+        with self._lock:
+            entries = []
+            for doc in docs:
+                id_ = doc.metadata.get("chunk_id")
+                if id_ is None or id_ in self._row:
+                    continue
+                terms = dict(Counter(tokenize(doc.page_content)))
+                row = self._insert(id_, dict(doc.metadata), terms)
+                if self.fetch is None:
+                    self._texts[row] = doc.page_content
+                entries.append({"id": id_, "metadata": self._metadatas[row], "terms": terms})
+            if entries and self.path:
+                self._append(entries)
+        return len(entries)
+
+    def delete(self, ids):
+        # Drops chunks and rewrites the log; rows are renumbered.
+        with self._lock:
+            drop = {self._row[i] for i in ids if i in self._row}
+            if not drop:
+                return 0
+            keep = [row for row in range(len(self._ids)) if row not in drop]
+            entries = self._entries(keep)
+            texts = [self._texts.get(row) for row in keep]
+            self._postings = defaultdict(dict)
+            self._ids, self._row, self._metadatas, self._texts = [], {}, [], {}
+            self._lengths, self._total_length = [], 0
+            for entry, text in zip(entries, texts):
+                row = self._insert(entry["id"], entry["metadata"], entry["terms"])
+                if text is not None:
+                    self._texts[row] = text
+            if self.path:
+                self._rewrite()
+        return len(drop)
+
+    def search(self, query, k=4, filter=None):
+        # Returns [(Document, score)] best first. No embedding call involved.
+        # Scoring takes well under a millisecond, so it simply holds the lock
+        # that add_documents (often on the ingest thread) writes under; the
+        # hits' texts are fetched after it is released.
+        with self._lock:
+            best = self._search(query, k, filter)
+            ids = [self._ids[row] for row, _ in best]
+            if self.fetch is None:
+                return [(Document(page_content=self._texts[row], metadata=dict(self._metadatas[row])), score)
+                        for row, score in best]
+        docs = self.fetch(ids)
+        return [(doc, score) for doc, (_, score) in zip(docs, best) if doc is not None]
+
+    def _search(self, query, k, filter):
+        n = len(self._ids)
+        if not n:
+            return []
+        allowed = None
+        if filter and list(filter) == ["chunk_id"]:
+            wanted = filter["chunk_id"]["$in"] if isinstance(filter["chunk_id"], dict) else [filter["chunk_id"]]
+            allowed = {self._row[i] for i in wanted if i in self._row}
+        elif filter:
+            match = compile_filter(filter)
+            allowed = {row for row, metadata in enumerate(self._metadatas) if match(metadata)}
+        avg_length = self._total_length / n
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings.items():
+                if allowed is not None and row not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[row] / avg_length)
+                scores[row] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
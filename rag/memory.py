@@ -1,5 +1,111 @@
-from langchain.memory import ConversationBufferMemory
+import threading
+from ingestion.chunker import estimate_tokens
+from rag.context import truncate_to_tokens
+from utils import metrics
+from utils.prompts import CONDENSE_QUESTION_PROMPT, SUMMARIZE_HISTORY_PROMPT
 
-def get_chat_memory():
-    # Use the latest recommended arguments for ConversationBufferMemory
-    return ConversationBufferMemory()
+# Verbatim recent turns are kept within this many tokens; older turns are
+# folded into a rolling summary capped at SUMMARY_TOKENS. Together they bound
+# the history part of every prompt, however long the session runs.
+HISTORY_TOKEN_BUDGET = 600
+SUMMARY_TOKENS = 200
+# A single long answer is clipped before it enters the window.
+MAX_TURN_ANSWER_TOKENS = 250
+
+
+def _text(message):
+    return getattr(message, "content", message) if not isinstance(message, str) else message
+
+
+class ConversationMemory:
+    def __init__(self, llm=None, token_budget=HISTORY_TOKEN_BUDGET, summary_tokens=SUMMARY_TOKENS):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self.turns = []  # (question, answer) pairs, oldest first
+        self.summarized_turns = 0
+        self._condensed = None  # (question, len(turns), standalone question)
+        self._lock = threading.Lock()
+
+    def _turn_text(self, question, answer):
+        return f"User: {question}\nAssistant: {answer}"
+
+    def _window_tokens(self):
+        return sum(estimate_tokens(self._turn_text(q, a)) for q, a in self.turns)
+
+    def add_turn(self, question, answer):
+        answer = truncate_to_tokens(answer.strip(), MAX_TURN_ANSWER_TOKENS)
+        with self._lock:
+            self.turns.append((question.strip(), answer))
+            self._condensed = None
+            evicted = []
+            while len(self.turns) > 1 and self._window_tokens() > self.token_budget:
+                evicted.append(self.turns.pop(0))
+        if evicted:
+            self._summarize(evicted)
+
+    def _summarize(self, evicted):
+        new_lines = "\n".join(self._turn_text(q, a) for q, a in evicted)
+        if self.llm is None:
+            # Without an LLM the summary is just the clipped transcript.
+            summary = f"{self.summary}\n{new_lines}".strip()
+        else:
+            prompt = SUMMARIZE_HISTORY_PROMPT.format(
+                summary=self.summary or "(none)", new_lines=new_lines, max_words=self.summary_tokens * 3 // 4
+            )
+            with metrics.span("memory.summarize", turns=len(evicted)):
+                summary = _text(self.llm.invoke(prompt)).strip()
+        with self._lock:
+            # Keep the most recent part if the model ignores the length limit.
+            if estimate_tokens(summary) > self.summary_tokens:
+                summary = "… " + summary[-self.summary_tokens * 4:].split(" ", 1)[-1]
+            self.summary = summary
+            self.summarized_turns += len(evicted)
+
+    def history_text(self):
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation: {self.summary}")
+        parts.extend(self._turn_text(q, a) for q, a in self.turns)
+        if not parts:
+            return ""
+        return "<conversation>\n" + "\n".join(parts) + "\n</conversation>\n\n"
+
+    def condense(self, question):
+        # Rewrites a follow-up ("what about its limitations?") into a question
+        # that stands on its own, so retrieval does not need the history.
+        if not self.turns and not self.summary:
+            return question
+        cached = self._condensed
+        if cached and cached[0] == question and cached[1] == len(self.turns):
+            return cached[2]
+        if self.llm is None:
+            return question
+        prompt = CONDENSE_QUESTION_PROMPT.format(history=self.history_text(), question=question)
+        with metrics.span("memory.condense"):
+            standalone = _text(self.llm.invoke(prompt)).strip() or question
+        self._condensed = (question, len(self.turns), standalone)
+        return standalone
+
+    def chain_input(self, question):
+        return {"input": question, "query": self.condense(question), "history": self.history_text()}
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self.summarized_turns = 0
+            self._condensed = None
+
+    def stats(self):
+        return {
+            "turns": len(self.turns),
+            "summarized_turns": self.summarized_turns,
+            "history_tokens": estimate_tokens(self.history_text()),
+        }
+
+
+def get_chat_memory(llm=None, token_budget=HISTORY_TOKEN_BUDGET):
+    # One per conversation; the app keeps it in st.session_state.
+    return ConversationMemory(llm, token_budget)
@@ -0,0 +1,382 @@
+import json
+import os
+import threading
+import uuid
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from rag.retrieval import _normalize, compile_filter, mmr_select
+
+# IVF only pays off once a flat scan is no longer trivially cheap.
+IVF_MIN_VECTORS = 5000
+IVF_N_PROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 20000
+# Rows are appended to VECTORS_FILE and logged one JSON line each to
+# DOCS_FILE, where a later line for a row replaces the earlier one. Both are
+# rewritten only by delete, or once overwrites make the log COMPACT_RATIO
+# times longer than the store.
+VECTORS_FILE = "vectors.f32"
+DOCS_FILE = "docs.jsonl"
+META_FILE = "meta.json"
+COMPACT_RATIO = 2
+MIN_CAPACITY = 1024
+
+
+def _log_line(row, id_, text, metadata):
+    return json.dumps([row, id_, text, metadata], ensure_ascii=False) + "\n"
+
+
+class NumpyVectorStore(VectorStore):
+    # In-process store: unit-normalized float32 rows in one contiguous matrix,
+    # cosine similarity as a single matrix-vector product. Persisted as raw
+    # float32 rows (memory-mapped on load) plus a JSON-lines log of ids,
+    # texts and metadata, both append-only. index_type="ivf" adds an
+    # inverted-file index (k-means lists, n_probe of them scanned per query)
+    # for large libraries.
+    def __init__(self, embedding, persist_directory=None, index_type="flat", n_probe=IVF_N_PROBE):
+        self._embedding = embedding
+        self.persist_directory = persist_directory
+        self.index_type = index_type
+        self.n_probe = n_probe
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._row = {}
+        # _matrix is the first _size rows of _buffer; the rest is spare
+        # capacity, so appends do not copy the store.
+        self._buffer = None
+        self._size = 0
+        self._matrix = None
+        self._log_lines = 0
+        self._centroids = None
+        self._lists = None
+        self._ivf_size = 0
+        # Held by writers while they change rows and by readers while they
+        # score them, so a search never sees _ids and _matrix out of step.
+        self._lock = threading.RLock()
+        if persist_directory:
+            self._load()
+            self._update_ivf(len(self._ids))
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _path(self, name):
+        return os.path.join(self.persist_directory, name)
+
+    def _load(self):
+        if not os.path.exists(self._path(DOCS_FILE)):
+            return
+        with open(self._path(META_FILE), "r", encoding="utf-8") as f:
+            dim = json.load(f)["dim"]
+        ids, texts, metadatas = [], [], []
+        intact = True
+        with open(self._path(DOCS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row, id_, text, metadata = json.loads(line)
+                except ValueError:
+                    # Cut short by an interrupted write; nothing after it counts.
+                    intact = False
+                    break
+                if row == len(ids):
+                    ids.append(id_)
+                    texts.append(text)
+                    metadatas.append(metadata)
+                elif row < len(ids):
+                    ids[row], texts[row], metadatas[row] = id_, text, metadata
+                else:
+                    intact = False
+                    break
+                self._log_lines += 1
+        rows = os.path.getsize(self._path(VECTORS_FILE)) // (4 * dim)
+        # Vectors are written before their log lines, so the log decides.
+        size = min(len(ids), rows)
+        self._ids, self._texts, self._metadatas = ids[:size], texts[:size], metadatas[:size]
+        self._row = {id_: i for i, id_ in enumerate(self._ids)}
+        if rows:
+            self._buffer = np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(rows, dim))
+        else:
+            self._buffer = np.empty((0, dim), np.float32)
+        self._size = size
+        self._matrix = self._buffer[:size]
+        if not intact or size < len(ids):
+            self._compact()
+
+    def _compact(self):
+        # Rewrites both files with exactly the live rows.
+        if not self.persist_directory or self._matrix is None:
+            return
+        os.makedirs(self.persist_directory, exist_ok=True)
+        if isinstance(self._buffer, np.memmap):
+            # Never keep a mapping of a file that is about to be replaced.
+            self._buffer = np.array(self._matrix)
+            self._matrix = self._buffer[:self._size]
+        vectors_path, docs_path, meta_path = self._path(VECTORS_FILE), self._path(DOCS_FILE), self._path(META_FILE)
+        with open(vectors_path + ".tmp", "wb") as f:
+            f.write(np.ascontiguousarray(self._matrix).tobytes())
+        with open(docs_path + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(_log_line(row, *doc) for row, doc in enumerate(zip(self._ids, self._texts, self._metadatas)))
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": self._matrix.shape[1]}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(docs_path + ".tmp", docs_path)
+        self._log_lines = self._size
+
+    def _append(self, updated_rows, first_new_row):
+        # Writes only what add_texts changed: overwritten rows in place, new
+        # rows on the end, and one log line for each.
+        if not self.persist_directory:
+            return
+        rows = [*updated_rows, *range(first_new_row, self._size)]
+        if not os.path.exists(self._path(DOCS_FILE)) or self._log_lines + len(rows) > COMPACT_RATIO * self._size:
+            self._compact()
+            return
+        row_bytes = self._matrix.shape[1] * 4
+        with open(self._path(VECTORS_FILE), "r+b") as f:
+            for row in updated_rows:
+                f.seek(row * row_bytes)
+                f.write(self._matrix[row].tobytes())
+            f.seek(first_new_row * row_bytes)
+            f.write(self._matrix[first_new_row:].tobytes())
+            f.truncate(self._size * row_bytes)
+        with open(self._path(DOCS_FILE), "a", encoding="utf-8") as f:
+            f.writelines(_log_line(r, self._ids[r], self._texts[r], self._metadatas[r]) for r in rows)
+        self._log_lines += len(rows)
+
+    def _reserve(self, rows, dim):
+        # Grows the buffer geometrically, so adding N rows one call at a time
+        # copies O(N) vectors in total. A memory-mapped buffer is read-only
+        # and is copied into memory on the first write.
+        buffer = self._buffer
+        if buffer is not None and rows <= len(buffer) and not isinstance(buffer, np.memmap):
+            return
+        capacity = max(rows, 2 * (len(buffer) if buffer is not None else 0), MIN_CAPACITY)
+        self._buffer = np.empty((capacity, dim), np.float32)
+        if self._size:
+            self._buffer[:self._size] = buffer[:self._size]
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        # An id repeated within the call keeps its last text and metadata.
+        keep = list({id_: i for i, id_ in enumerate(ids)}.values())
+        vectors = _normalize(self._embedding.embed_documents([texts[i] for i in keep]))
+
+        with self._lock:
+            # Existing ids are overwritten in place, new ones appended.
+            first_new_row = self._size
+            updated_rows = []
+            new = []
+            self._reserve(self._size + len(keep), vectors.shape[1])
+            for i, vector in zip(keep, vectors):
+                row = self._row.get(ids[i])
+                if row is None:
+                    new.append(vector)
+                    row = self._row[ids[i]] = self._size + len(new) - 1
+                    self._ids.append(ids[i])
+                    self._texts.append(texts[i])
+                    self._metadatas.append(dict(metadatas[i]))
+                else:
+                    updated_rows.append(row)
+                    self._buffer[row] = vector
+                    self._texts[row] = texts[i]
+                    self._metadatas[row] = dict(metadatas[i])
+            if new:
+                self._buffer[first_new_row:first_new_row + len(new)] = new
+            self._size += len(new)
+            self._matrix = self._buffer[:self._size]
+            self._update_ivf(first_new_row)
+            self._append(updated_rows, first_new_row)
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        drop = set(ids)
+        with self._lock:
+            keep = [i for i, id_ in enumerate(self._ids) if id_ not in drop]
+            self._buffer = np.ascontiguousarray(np.asarray(self._matrix)[keep])
+            self._size = len(keep)
+            self._matrix = self._buffer
+            self._ids = [self._ids[i] for i in keep]
+            self._texts = [self._texts[i] for i in keep]
+            self._metadatas = [self._metadatas[i] for i in keep]
+            self._row = {id_: i for i, id_ in enumerate(self._ids)}
+            self._centroids = self._lists = None
+            self._update_ivf(0)
+            self._compact()
+        return True
+
+    def get(self, ids=None, where=None, include=None, **kwargs):
+        # Same shape as Chroma.get, which create_or_load_vectorstore relies on.
+        with self._lock:
+            rows = self._filter_rows(where)
+            if ids is not None:
+                wanted = [self._row[i] for i in ids if i in self._row]
+                if rows is not None:
+                    allowed = set(rows)
+                    wanted = [r for r in wanted if r in allowed]
+                rows = wanted
+            elif rows is None:
+                rows = range(len(self._ids))
+            result = {"ids": [self._ids[r] for r in rows]}
+            include = ["documents", "metadatas"] if include is None else include
+            if "documents" in include:
+                result["documents"] = [self._texts[r] for r in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[r] for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.asarray(self._matrix)[list(rows)]
+            return result
+
+    def get_by_ids(self, ids):
+        with self._lock:
+            return [self._document(self._row[i]) for i in ids if i in self._row]
+
+    def _update_ivf(self, first_new_row):
+        n = len(self._ids)
+        if self.index_type != "ivf" or n < IVF_MIN_VECTORS:
+            self._centroids = self._lists = None
+            return
+        # Rebuild once the store has doubled since the last build; otherwise
+        # just drop the new rows into their nearest list.
+        if self._centroids is None or n >= 2 * self._ivf_size:
+            self._build_ivf()
+            return
+        new = np.asarray(self._matrix[first_new_row:])
+        if len(new):
+            assignment = np.argmax(new @ self._centroids.T, axis=1)
+            for list_id in np.unique(assignment):
+                rows = first_new_row + np.flatnonzero(assignment == list_id)
+                self._lists[list_id] = np.concatenate([self._lists[list_id], rows])
+
+    def _build_ivf(self):
+        matrix = np.asarray(self._matrix)
+        n = len(matrix)
+        n_lists = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample = matrix[rng.choice(n, size=min(n, KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+        # Spherical k-means: vectors are unit length, so argmax dot = nearest.
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self._centroids = centroids
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(n_lists)]
+        self._ivf_size = n
+
+    def _filter_rows(self, where):
+        if not where:
+            return None
+        # Scoping by chunk_id is the common case and needs no metadata scan.
+        if list(where) == ["chunk_id"]:
+            condition = where["chunk_id"]
+            wanted = condition["$in"] if isinstance(condition, dict) else [condition]
+            return sorted(self._row[i] for i in wanted if i in self._row)
+        match = compile_filter(where)
+        return [i for i, metadata in enumerate(self._metadatas) if match(metadata)]
+
+    def _top_rows(self, query_vector, k, filter=None):
+        if not self._ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = _normalize(query_vector)
+        rows = self._filter_rows(filter)
+        if rows is None and self._centroids is not None:
+            probe = np.argsort(-(self._centroids @ query))[:self.n_probe]
+            rows = np.concatenate([self._lists[i] for i in probe])
+        if rows is None:
+            scores = self._matrix @ query
+            rows = np.arange(len(scores))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            scores = self._matrix[rows] @ query if len(rows) else np.empty(0, dtype=np.float32)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def _document(self, row):
+        return Document(page_content=self._texts[row], metadata=dict(self._metadatas[row]), id=self._ids[row])
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        with self._lock:
+            rows, scores = self._top_rows(embedding, k, filter)
+            return [(self._document(r), float(s)) for r, s in zip(rows, scores)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    def candidates_by_vector(self, embedding, fetch_k=20, filter=None):
+        # Used by rag.retrieval.MMRRetriever: the nearest rows plus their vectors.
+        with self._lock:
+            rows, _ = self._top_rows(embedding, fetch_k, filter)
+            return [self._document(r) for r in rows], np.asarray(self._matrix[rows])
+
+    def candidates_by_vectors(self, embeddings, fetch_k=20, filter=None):
+        # candidates_by_vector for many queries: the filter is resolved once
+        # and every query is scored in a single matrix-matrix product. IVF
+        # probes differ per query, so that path stays a loop.
+        with self._lock:
+            if self._centroids is not None and not filter:
+                return [self.candidates_by_vector(e, fetch_k) for e in embeddings]
+            queries = _normalize(embeddings)
+            rows = self._filter_rows(filter) if self._ids else []
+            if rows is None:
+                rows = np.arange(len(self._ids))
+                matrix = self._matrix
+            else:
+                rows = np.asarray(rows, dtype=np.int64)
+                matrix = self._matrix[rows] if len(rows) else None
+            k = min(fetch_k, len(rows))
+            if k <= 0 or not len(queries):
+                return [([], np.empty((0, 0), dtype=np.float32)) for _ in range(len(queries))]
+            scores = queries @ matrix.T
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            results = []
+            for i, cols in enumerate(top):
+                cols = cols[np.argsort(-scores[i, cols])]
+                results.append(([self._document(r) for r in rows[cols]], np.asarray(matrix[cols])))
+            return results
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        docs, matrix = self.candidates_by_vector(embedding, fetch_k, filter)
+        return [docs[i] for i in mmr_select(embedding, matrix, k, lambda_mult)]
+
+    def max_marginal_relevance_search(self, query, k=4, fetch_k=20, lambda_mult=0.5, filter=None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, persist_directory=None, index_type="flat", **kwargs):
+        store = cls(embedding, persist_directory=persist_directory, index_type=index_type)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
@@ -0,0 +1,197 @@
+import os
+import time
+from typing import Any, Optional
+import numpy as np
+from langchain_core.retrievers import BaseRetriever
+from rag.embeddings import embed_queries
+from utils import metrics
+
+K = 4
+FETCH_K = 20
+LAMBDA_MULT = 0.5
+# "hybrid" fuses BM25 and dense rankings, "dense" is embeddings only, and
+# "lexical" answers from the BM25 index with no embedding call at all.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RRF_K = 60
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(query, candidates, k=K, lambda_mult=LAMBDA_MULT):
+    # Maximal marginal relevance over a candidate matrix. Each step is one
+    # matrix-vector product: the running max similarity to the selected set
+    # is updated incrementally instead of re-scoring every pair.
+    candidates = _normalize(candidates)
+    if candidates.ndim != 2 or not len(candidates) or k <= 0:
+        return []
+    query = _normalize(query)
+    k = min(k, len(candidates))
+    relevance = candidates @ query
+    first = int(np.argmax(relevance))
+    selected = [first]
+    taken = np.zeros(len(candidates), dtype=bool)
+    taken[first] = True
+    redundancy = candidates @ candidates[first]
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[taken] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        taken[best] = True
+        np.maximum(redundancy, candidates @ candidates[best], out=redundancy)
+    return selected
+
+
+def compile_filter(where):
+    # Turns the subset of Chroma's where syntax this app produces into a
+    # metadata predicate; $in lists become sets once, up front.
+    if not where:
+        return lambda metadata: True
+    checks = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [compile_filter(c) for c in condition]
+            combine = all if key == "$and" else any
+            checks.append(lambda m, parts=parts, combine=combine: combine(p(m) for p in parts))
+        elif isinstance(condition, dict):
+            if "$in" in condition:
+                values = set(condition["$in"])
+                checks.append(lambda m, key=key, values=values: m.get(key) in values)
+            if "$eq" in condition:
+                checks.append(lambda m, key=key, value=condition["$eq"]: m.get(key) == value)
+        else:
+            checks.append(lambda m, key=key, value=condition: m.get(key) == value)
+    return lambda metadata: all(check(metadata) for check in checks)
+
+
+def fetch_candidates(vectordb, query_vector, fetch_k=FETCH_K, filter=None):
+    # Returns (documents, embedding matrix) for the fetch_k nearest chunks.
+    if hasattr(vectordb, "candidates_by_vector"):
+        return vectordb.candidates_by_vector(query_vector, fetch_k, filter)
+    return fetch_candidates_batch(vectordb, [query_vector], fetch_k, filter)[0]
+
+
+def fetch_candidates_batch(vectordb, query_vectors, fetch_k=FETCH_K, filter=None):
+    # fetch_candidates for many queries in one pass over the store.
+    if hasattr(vectordb, "candidates_by_vectors"):
+        return vectordb.candidates_by_vectors(query_vectors, fetch_k, filter)
+    if hasattr(vectordb, "candidates_by_vector"):
+        return [vectordb.candidates_by_vector(v, fetch_k, filter) for v in query_vectors]
+    # Chroma: a search per query, then the embeddings of every hit in one get.
+    hits = [vectordb.similarity_search_by_vector_with_relevance_scores(list(v), fetch_k, filter)
+            for v in query_vectors]
+    ids = list(dict.fromkeys(doc.metadata["chunk_id"] for docs in hits for doc, _ in docs))
+    stored = vectordb.get(ids=ids, include=["embeddings"]) if ids else {"ids": [], "embeddings": []}
+    embeddings = dict(zip(stored["ids"], stored["embeddings"]))
+    candidates = []
+    for docs in hits:
+        docs = [doc for doc, _ in docs]
+        for doc in docs:
+            doc.id = doc.metadata["chunk_id"]
+        candidates.append((docs, np.asarray([embeddings[doc.id] for doc in docs], dtype=np.float32)))
+    return candidates
+
+
+def _record(mode, start, dense=0, lexical=0):
+    # Per-query latency by mode, plus how many candidates each side produced.
+    metrics.observe(f"retrieve.latency.{mode}", time.perf_counter() - start)
+    metrics.increment(f"retrieve.queries.{mode}")
+    metrics.increment("retrieve.candidates.dense", dense)
+    metrics.increment("retrieve.candidates.lexical", lexical)
+
+
+class MMRRetriever(BaseRetriever):
+    vectorstore: Any
+    k: int = K
+    fetch_k: int = FETCH_K
+    lambda_mult: float = LAMBDA_MULT
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with metrics.span("retrieve", mode="dense"):
+            return self._dense(query)
+
+    def _dense(self, query):
+        start = time.perf_counter()
+        with metrics.span("retrieve.embed"):
+            query_vector = self.vectorstore.embeddings.embed_query(query)
+        with metrics.span("retrieve.fetch"):
+            docs, matrix = fetch_candidates(self.vectorstore, query_vector, self.fetch_k, self.filter)
+        with metrics.span("retrieve.mmr"):
+            picked = [docs[i] for i in mmr_select(query_vector, matrix, self.k, self.lambda_mult)]
+        _record("dense", start, dense=len(docs))
+        return picked
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc.metadata.get("chunk_id") or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(MMRRetriever):
+    lexical_index: Any = None
+    mode: str = RETRIEVAL_MODE
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        if self.mode == "dense" or self.lexical_index is None:
+            return super()._get_relevant_documents(query, run_manager=run_manager)
+        with metrics.span("retrieve", mode=self.mode):
+            return self._hybrid(query)
+
+    def _hybrid(self, query):
+        start = time.perf_counter()
+        if self.mode == "lexical":
+            with metrics.span("retrieve.lexical"):
+                picked = [doc for doc, _ in self.lexical_index.search(query, self.k, self.filter)]
+            _record("lexical", start, lexical=len(picked))
+            return picked
+        with metrics.span("retrieve.lexical"):
+            lexical = [doc for doc, _ in self.lexical_index.search(query, self.fetch_k, self.filter)]
+        with metrics.span("retrieve.embed"):
+            query_vector = self.vectorstore.embeddings.embed_query(query)
+        with metrics.span("retrieve.fetch"):
+            docs, matrix = fetch_candidates(self.vectorstore, query_vector, self.fetch_k, self.filter)
+        # The dense side keeps its MMR order so diversity still counts.
+        with metrics.span("retrieve.mmr"):
+            dense = [docs[i] for i in mmr_select(query_vector, matrix, len(docs), self.lambda_mult)]
+        picked = reciprocal_rank_fusion([dense, lexical])[:self.k]
+        _record("hybrid", start, dense=len(dense), lexical=len(lexical))
+        return picked
+
+    def retrieve_batch(self, queries):
+        # Many questions over one index: all queries are embedded in one call
+        # and their candidates fetched in one pass; MMR and fusion stay per
+        # query. Returns a list of documents per query, in order.
+        with metrics.span("retrieve.batch", queries=len(queries), mode=self.mode):
+            metrics.increment(f"retrieve.queries.{self.mode}", len(queries))
+            lexical = [None] * len(queries)
+            if self.mode != "dense" and self.lexical_index is not None:
+                k = self.k if self.mode == "lexical" else self.fetch_k
+                with metrics.span("retrieve.lexical"):
+                    lexical = [[doc for doc, _ in self.lexical_index.search(q, k, self.filter)] for q in queries]
+                metrics.increment("retrieve.candidates.lexical", sum(len(docs) for docs in lexical))
+                if self.mode == "lexical":
+                    return lexical
+            vectors = embed_queries(self.vectorstore.embeddings, queries)
+            with metrics.span("retrieve.fetch"):
+                candidates = fetch_candidates_batch(self.vectorstore, vectors, self.fetch_k, self.filter)
+            metrics.increment("retrieve.candidates.dense", sum(len(docs) for docs, _ in candidates))
+            results = []
+            with metrics.span("retrieve.mmr"):
+                for vector, lexical_docs, (docs, matrix) in zip(vectors, lexical, candidates):
+                    if lexical_docs is None:
+                        results.append([docs[i] for i in mmr_select(vector, matrix, self.k, self.lambda_mult)])
+                    else:
+                        dense = [docs[i] for i in mmr_select(vector, matrix, len(docs), self.lambda_mult)]
+                        results.append(reciprocal_rank_fusion([dense, lexical_docs])[:self.k])
+        return results
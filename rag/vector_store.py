@@ -1,26 +1,142 @@
 import os
 import asyncio
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import hashlib
+from rag.embeddings import get_embeddings
+from rag.lexical import BM25Index
+from utils import metrics
 
-def create_or_load_vectorstore(documents):
+# "chroma" (default) or "numpy" for the in-process rag.numpy_store backend;
+# "numpy-ivf" adds its approximate inverted-file index.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+PERSIST_DIRECTORIES = {
+    "chroma": "data/chroma_db",
+    "numpy": "data/numpy_index",
+    "numpy-ivf": "data/numpy_index",
+}
+PERSIST_DIRECTORY = PERSIST_DIRECTORIES["chroma"]
+# The BM25 index lives next to the vectors it mirrors.
+LEXICAL_INDEX_FILE = "lexical_index.jsonl"
+
+_stores = {}
+# id(store) -> the BM25 index over the same chunks.
+_lexical = {}
+# Bumped whenever new chunks land in a store, so anything memoized against
+# the index (chains, answers) can tell it is stale.
+_versions = {}
+
+
+def chunk_id(doc):
+    # Stable across sessions: the same section of the same paper always maps
+    # to the same vector, and edited content gets a fresh ID.
+    h = hashlib.sha256()
+    for part in (doc.metadata.get("source") or "", doc.metadata.get("section") or "", doc.page_content):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:32]
+
+
+def _get_store(persist_directory, embedding=None, backend=VECTOR_BACKEND):
+    store = _stores.get((backend, persist_directory))
+    if store is None:
+        embedding = embedding or get_embeddings()
+        with metrics.span("index.open", backend=backend):
+            if backend == "chroma":
+                # langchain_community and chromadb take about a second to import.
+                from langchain_community.vectorstores import Chroma
+                store = Chroma(persist_directory=persist_directory, embedding_function=embedding)
+            elif backend in ("numpy", "numpy-ivf"):
+                from rag.numpy_store import NumpyVectorStore
+                index_type = "ivf" if backend == "numpy-ivf" else "flat"
+                store = NumpyVectorStore(embedding, persist_directory=persist_directory, index_type=index_type)
+            else:
+                raise ValueError(f"Unknown vector store backend: {backend}")
+        _lexical[id(store)] = BM25Index(
+            os.path.join(persist_directory, LEXICAL_INDEX_FILE), fetch=lambda ids: fetch_documents(store, ids)
+        )
+        _stores[(backend, persist_directory)] = store
+    return store
+
+
+def fetch_documents(vectordb, ids):
+    # Documents for ids in the same order, None for any the store lacks.
+    from langchain_core.documents import Document
+    result = vectordb.get(ids=list(ids), include=["documents", "metadatas"])
+    found = {
+        id_: Document(page_content=text, metadata=metadata or {}, id=id_)
+        for id_, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+    }
+    return [found.get(id_) for id_ in ids]
+
+
+def lexical_index(vectordb):
+    # None for a store that was not opened through create_or_load_vectorstore.
+    return _lexical.get(id(vectordb))
+
+
+def index_version(vectordb):
+    return _versions.get(id(vectordb), 0)
+
+
+def create_or_load_vectorstore(documents, persist_directory=None, embedding=None, backend=None):
+    backend = backend or VECTOR_BACKEND
+    persist_directory = persist_directory or PERSIST_DIRECTORIES[backend]
     try:
         asyncio.get_running_loop()
     except RuntimeError:
         asyncio.set_event_loop(asyncio.new_event_loop())
 
-    # Filter out empty documents
-    non_empty_docs = [doc for doc in documents if doc.page_content.strip()]
-    if not non_empty_docs:
-        raise ValueError("No non-empty documents to index.")
+    with metrics.span("index", backend=backend) as span:
+        # Filter out empty documents
+        non_empty_docs = [doc for doc in documents if doc.page_content.strip()]
+        if not non_empty_docs:
+            raise ValueError("No non-empty documents to index.")
 
-    embedding = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+        unique_docs = {}
+        for doc in non_empty_docs:
+            doc.metadata["chunk_id"] = chunk_id(doc)
+            unique_docs.setdefault(doc.metadata["chunk_id"], doc)
 
-    vectorstore = Chroma.from_documents(
-        non_empty_docs,
-        embedding=embedding,
-        persist_directory="data/chroma_db"
-    )
+        vectorstore = _get_store(persist_directory, embedding, backend)
+        # Only chunks the store has never seen are sent to the embedding API.
+        with metrics.span("index.lookup"):
+            existing = set(vectorstore.get(ids=list(unique_docs), include=[])["ids"])
+        new_ids = [i for i in unique_docs if i not in existing]
+        span.set(chunks=len(unique_docs), new=len(new_ids))
+        metrics.increment("index.chunks_added", len(new_ids))
+        metrics.increment("index.chunks_skipped", len(unique_docs) - len(new_ids))
+        if new_ids:
+            # Embedding calls show up as embed.* spans inside this one.
+            with metrics.span("index.add", chunks=len(new_ids)):
+                vectorstore.add_documents([unique_docs[i] for i in new_ids], ids=new_ids)
+            _versions[id(vectorstore)] = index_version(vectorstore) + 1
+        # The BM25 side is cheap to keep in step; already-indexed chunks are skipped.
+        with metrics.span("index.lexical"):
+            lexical_index(vectorstore).add_documents(unique_docs.values())
     return vectorstore
 
+
+def delete_chunks(ids, persist_directory=None, embedding=None, backend=None):
+    # Removes chunks from the store and its BM25 index, e.g. those of a PDF
+    # that was deleted from the papers folder.
+    backend = backend or VECTOR_BACKEND
+    persist_directory = persist_directory or PERSIST_DIRECTORIES[backend]
+    ids = list(ids)
+    if not ids:
+        return
+    vectorstore = _get_store(persist_directory, embedding, backend)
+    with metrics.span("index.delete", chunks=len(ids)):
+        vectorstore.delete(ids)
+        lexical_index(vectorstore).delete(ids)
+    metrics.increment("index.chunks_deleted", len(ids))
+    _versions[id(vectorstore)] = index_version(vectorstore) + 1
+
+
+def scope_filter(documents):
+    # Restrict retrieval to the chunks selected for this question; the shared
+    # store also holds every paper indexed in earlier sessions.
+    ids = sorted({doc.metadata["chunk_id"] for doc in documents if "chunk_id" in doc.metadata})
+    if not ids:
+        return None
+    if len(ids) == 1:
+        return {"chunk_id": ids[0]}
+    return {"chunk_id": {"$in": ids}}
@@ -0,0 +1,72 @@
+import types
+from rag import answer_cache
+from rag.answer_cache import AnswerCache
+
+CHUNKS = ["c1", "c2"]
+
+
+class TableEmbeddings:
+    # Query vectors picked by the test, so similarity is known exactly.
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return self.vectors[text]
+
+
+VECTORS = {
+    "What pins the vortices?": [1.0, 0.0, 0.0],
+    "Which layer pins vortices?": [0.99, 0.1, 0.0],  # cosine ~0.995
+    "How was the sample grown?": [0.0, 1.0, 0.0],
+}
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = AnswerCache()
+    cache.put("default", CHUNKS, "What pins the vortices?", "Gold.")
+    assert cache.get("default", list(reversed(CHUNKS)), "what pins the VORTICES") == "Gold."
+    assert (cache.hits, cache.near_hits, cache.misses) == (1, 0, 0)
+
+
+def test_scope_and_persona_are_part_of_the_key():
+    cache = AnswerCache()
+    cache.put("default", CHUNKS, "What pins the vortices?", "Gold.")
+    assert cache.get("student", CHUNKS, "What pins the vortices?") is None
+    assert cache.get("default", ["c1"], "What pins the vortices?") is None
+    assert cache.misses == 2
+
+
+def test_near_duplicate_hits_and_dissimilar_question_misses():
+    cache = AnswerCache(TableEmbeddings(VECTORS))
+    cache.put("default", CHUNKS, "What pins the vortices?", "Gold.")
+    assert cache.get("default", CHUNKS, "Which layer pins vortices?") == "Gold."
+    assert cache.get("default", CHUNKS, "How was the sample grown?") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["near_hits"], stats["misses"]) == (0, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    cache = AnswerCache(ttl=60)
+    cache.put("default", CHUNKS, "What pins the vortices?", "Gold.")
+    now[0] += 59
+    assert cache.get("default", CHUNKS, "What pins the vortices?") == "Gold."
+    now[0] += 2
+    assert cache.get("default", CHUNKS, "What pins the vortices?") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    cache = AnswerCache(max_entries=2)
+    cache.put("default", CHUNKS, "first", "1")
+    cache.put("default", CHUNKS, "second", "2")
+    assert cache.get("default", CHUNKS, "first") == "1"
+    cache.put("default", CHUNKS, "third", "3")
+    assert cache.get("default", CHUNKS, "second") is None
+    assert cache.get("default", CHUNKS, "first") == "1"
+    assert cache.get("default", CHUNKS, "third") == "3"
+    assert cache.stats()["entries"] == 2
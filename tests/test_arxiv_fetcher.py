@@ -0,0 +1,109 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from ingestion.arxiv_fetcher import TokenBucket, download_latest_papers, existing_papers
+
+PDFS = {
+    "/pdf/2507.00001v1": b"%PDF-1.4 first " + bytes(range(256)) * 64,
+    "/pdf/2507.00002v2": b"%PDF-1.4 second " + bytes(range(256)) * 32,
+}
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <id>http://arxiv.org/abs/2507.00001v1</id>
+    <title>First  Paper:
+      A Study</title>
+    <published>2025-07-01T00:00:00Z</published>
+    <link title="pdf" href="{base}/pdf/2507.00001v1" rel="related" type="application/pdf"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2507.00002v2</id>
+    <title>Second Paper</title>
+    <published>2025-07-02T00:00:00Z</published>
+    <link title="pdf" href="{base}/pdf/2507.00002v2" rel="related" type="application/pdf"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2507.00003v1</id>
+    <title>Missing Paper</title>
+    <published>2025-07-03T00:00:00Z</published>
+    <link title="pdf" href="{base}/pdf/2507.00003v1" rel="related" type="application/pdf"/>
+  </entry>
+</feed>
+"""
+
+
+class StubArxiv(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        self.requests.append((path, self.headers.get("Range")))
+        if path == "/api/query":
+            body = FEED.format(base=f"http://{self.headers['Host']}").encode()
+            self.send_response(200)
+        elif path in PDFS:
+            body = PDFS[path]
+            offset = int(self.headers["Range"][len("bytes="):-1]) if self.headers.get("Range") else 0
+            if offset >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206 if offset else 200)
+            body = body[offset:]
+        else:
+            body = b"not found"
+            self.send_response(404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubArxiv)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    StubArxiv.requests = []
+    yield f"http://127.0.0.1:{server.server_port}/api/query"
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(save_dir, api_url):
+    return download_latest_papers(
+        "LLM", 3, str(save_dir), api_url=api_url, limiter=TokenBucket(rate=1000, capacity=100)
+    )
+
+
+def test_downloads_feed_papers_and_skips_missing(tmp_path, api_url):
+    paths = fetch(tmp_path, api_url)
+    assert [os.path.basename(p) for p in paths] == [
+        "2507.00001v1.First_Paper__A_Study.pdf",
+        "2507.00002v2.Second_Paper.pdf",
+    ]
+    with open(paths[0], "rb") as f:
+        assert f.read() == PDFS["/pdf/2507.00001v1"]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+
+def test_papers_on_disk_are_not_downloaded_again(tmp_path, api_url):
+    first = fetch(tmp_path, api_url)
+    StubArxiv.requests = []
+    assert fetch(tmp_path, api_url) == first
+    assert [path for path, _ in StubArxiv.requests] == ["/api/query", "/pdf/2507.00003v1"]
+    assert set(existing_papers(str(tmp_path))) == {"2507.00001", "2507.00002"}
+
+
+def test_partial_download_is_resumed(tmp_path, api_url):
+    body = PDFS["/pdf/2507.00001v1"]
+    part = tmp_path / "2507.00001v1.First_Paper__A_Study.pdf.part"
+    part.write_bytes(body[:1000])
+    paths = fetch(tmp_path, api_url)
+    with open(paths[0], "rb") as f:
+        assert f.read() == body
+    assert ("/pdf/2507.00001v1", "bytes=1000-") in StubArxiv.requests
@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from rag import vector_store
+from rag.batch import (RESULT_FIELDS, answer_questions, format_summary, parse_questions, to_csv, to_jsonl,
+                       write_results)
+from rag.fakes import HashEmbeddings, fake_chat_model
+
+QUESTIONS = ["What pins the vortices?", "Which field was applied?", "What limits the critical current?"]
+
+
+@pytest.fixture
+def vectordb(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_stores", {})
+    docs = [
+        Document(page_content=f"Section {i} reports vortex pinning measurement number {i}.",
+                 metadata={"source": "paper.pdf", "section": f"Section {i}", "page": i + 1})
+        for i in range(6)
+    ]
+    return vector_store.create_or_load_vectorstore(docs, str(tmp_path), HashEmbeddings(size=32), "numpy")
+
+
+def failing_llm(bad_word):
+    # Answers every prompt except those that mention bad_word.
+    def answer(prompt):
+        if bad_word in prompt.to_string():
+            raise RuntimeError("quota exceeded")
+        return AIMessage(content="An answer [1].")
+    return RunnableLambda(answer)
+
+
+def test_one_row_per_question_in_order(vectordb):
+    rows = answer_questions(vectordb, QUESTIONS, llm=fake_chat_model(["An answer [1]."]), max_concurrency=2)
+    assert [r["question"] for r in rows] == QUESTIONS
+    for row in rows:
+        assert list(row) == RESULT_FIELDS
+        assert row["answer"] == "An answer [1]." and row["error"] == ""
+        assert row["sources"].startswith("paper.pdf | Section ")
+        assert row["latency_ms"] >= row["generation_ms"] >= 0
+        assert row["prompt_tokens"] > 0
+    assert answer_questions(vectordb, []) == []
+
+
+def test_a_failed_question_gets_its_error_in_its_row(vectordb):
+    rows = answer_questions(vectordb, QUESTIONS, llm=failing_llm("field"))
+    assert [r["error"] for r in rows] == ["", "RuntimeError: quota exceeded", ""]
+    failed = rows[1]
+    assert failed["answer"] == "" and failed["latency_ms"] is None and failed["sources"]
+    assert rows[0]["answer"] == rows[2]["answer"] == "An answer [1]."
+    summary = format_summary(rows, 2.0)
+    assert summary.startswith("2/3 questions answered in 2.0s (1.5 questions/s)")
+    assert format_summary(rows[1:2], 1.0) == "0/1 questions answered in 1.0s"
+
+
+def test_csv_and_jsonl_writers(tmp_path):
+    blank = dict.fromkeys(RESULT_FIELDS, "")
+    rows = [
+        {**blank, "question": "Why, \"exactly\"?", "answer": "Line one\nline two", "latency_ms": 12.5},
+        {**blank, "question": "Tc of Nb?", "answer": "9.2 K", "latency_ms": None},
+    ]
+    parsed = list(csv.DictReader(io.StringIO(to_csv(rows))))
+    assert [r["question"] for r in parsed] == ["Why, \"exactly\"?", "Tc of Nb?"]
+    assert parsed[0]["answer"] == "Line one\nline two" and parsed[0]["latency_ms"] == "12.5"
+    assert [json.loads(line) for line in to_jsonl(rows).splitlines()] == rows
+
+    write_results(rows, str(tmp_path / "out.jsonl"))
+    write_results(rows, str(tmp_path / "out.csv"))
+    assert (tmp_path / "out.jsonl").read_text(encoding="utf-8") == to_jsonl(rows)
+    with open(tmp_path / "out.csv", encoding="utf-8", newline="") as f:
+        assert f.read() == to_csv(rows)
+
+
+def test_parse_questions_formats():
+    assert parse_questions("First?\n\n  Second?  \n") == ["First?", "Second?"]
+    assert parse_questions("id,Question\n1,First?\n2,\"Second, really?\"\n3\n", ".CSV") == ["First?", "Second, really?"]
+    assert parse_questions("First?\nSecond?\n", ".csv") == ["First?", "Second?"]
+    assert parse_questions('{"question": "First?"}\n\n{"question": " Second? ", "id": 2}\n', ".jsonl") == [
+        "First?", "Second?"]
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+import pytest
+from langchain_core.documents import Document
+from rag import chain as rag_chain
+from rag import vector_store
+from rag.chain import build_rag_chain, stream_answer
+from rag.fakes import HashEmbeddings, fake_chat_model
+from rag.vector_store import create_or_load_vectorstore, scope_filter
+
+ANSWER = "Vortices are pinned by the gold layer [1]."
+
+
+def documents(start=0, n=6):
+    return [
+        Document(page_content=f"Section {i} reports vortex pinning measurement number {i}.",
+                 metadata={"source": "paper.pdf", "section": f"Section {i}", "page": 1})
+        for i in range(start, start + n)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_stores", {})
+    monkeypatch.setattr(rag_chain, "_chains", OrderedDict())
+    embedding = HashEmbeddings(size=32)
+    docs = documents()
+    vectordb = create_or_load_vectorstore(docs, str(tmp_path), embedding, "numpy")
+    return vectordb, docs, embedding, str(tmp_path)
+
+
+def test_stream_yields_tokens_in_order_and_records_timings(store):
+    vectordb, docs, _, _ = store
+    chain = build_rag_chain(vectordb, search_filter=scope_filter(docs), llm=fake_chat_model([ANSWER]))
+    stats = {}
+    chunks = list(stream_answer(chain, "What pins the vortices?", stats))
+    assert len(chunks) > 1
+    assert "".join(chunks) == ANSWER
+    assert 0 < stats["ttft"] <= stats["total"]
+
+
+def test_same_key_reuses_the_chain(store):
+    vectordb, docs, _, _ = store
+    llm = fake_chat_model([ANSWER])
+    scope = scope_filter(docs)
+    chain = build_rag_chain(vectordb, "default", search_filter=scope, llm=llm)
+    assert build_rag_chain(vectordb, "default", search_filter=dict(scope), llm=llm) is chain
+    assert build_rag_chain(vectordb, "student", search_filter=scope, llm=llm) is not chain
+    assert build_rag_chain(vectordb, "default", search_filter=scope_filter(docs[:2]), llm=llm) is not chain
+    assert build_rag_chain(vectordb, "default", search_filter=scope, llm=llm, k=2) is not chain
+    assert build_rag_chain(vectordb, "default", search_filter=scope, llm=fake_chat_model([ANSWER])) is not chain
+
+
+def test_new_chunks_in_the_store_invalidate_the_chain(store):
+    vectordb, docs, embedding, path = store
+    llm = fake_chat_model([ANSWER])
+    chain = build_rag_chain(vectordb, search_filter=scope_filter(docs), llm=llm)
+    # Re-adding known chunks leaves the index version alone.
+    create_or_load_vectorstore(documents(), path, embedding, "numpy")
+    assert build_rag_chain(vectordb, search_filter=scope_filter(docs), llm=llm) is chain
+    create_or_load_vectorstore(documents(6, 2), path, embedding, "numpy")
+    assert build_rag_chain(vectordb, search_filter=scope_filter(docs), llm=llm) is not chain
+
+
+def test_cache_is_bounded(store, monkeypatch):
+    vectordb, docs, _, _ = store
+    monkeypatch.setattr(rag_chain, "MAX_CACHED_CHAINS", 2)
+    llm = fake_chat_model([ANSWER])
+    first = build_rag_chain(vectordb, k=1, llm=llm)
+    build_rag_chain(vectordb, k=2, llm=llm)
+    build_rag_chain(vectordb, k=3, llm=llm)
+    assert len(rag_chain._chains) == 2
+    assert build_rag_chain(vectordb, k=1, llm=llm) is not first
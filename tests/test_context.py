@@ -0,0 +1,66 @@
+from langchain_core.documents import Document
+from ingestion.chunker import estimate_tokens
+from rag.context import MIN_PACKED_TOKENS, pack_context
+
+WORDS = "vortex pinning niobium film critical current field gold capping layer grain boundary".split()
+
+
+def text(n_words, offset=0):
+    return " ".join(WORDS[(offset + i) % len(WORDS)] + str(offset + i) for i in range(n_words))
+
+
+def chunk(content, source="a.pdf", section="Results", n=None, **metadata):
+    metadata = {"source": source, "section": section, **metadata}
+    if n is not None:
+        metadata["chunk"] = n
+    return Document(page_content=content, metadata=metadata)
+
+
+def test_blocks_are_numbered_and_cited_in_order():
+    docs = [
+        chunk(text(20), page=3),
+        chunk(text(20, 100), source="b.pdf", section="Methods", page=4, page_end=6),
+        chunk(text(20, 200), source=None, section=None),
+    ]
+    context, stats = pack_context(docs, 10000)
+    blocks = context.split("\n\n")
+    assert [b.split("\n")[0] for b in blocks] == [
+        "[1] a.pdf | Results | p. 3", "[2] b.pdf | Methods | pp. 4-6", "[3] unknown source"]
+    assert [b.split("\n", 1)[1] for b in blocks] == [d.page_content for d in docs]
+    assert stats["packed"] == 3 and stats["retrieved"] == 3
+
+
+def test_repeats_are_packed_once():
+    first = chunk(text(20), chunk_id="c1")
+    same_id = chunk(text(20, 50), chunk_id="c1")
+    same_text = chunk(text(20, 100))
+    context, stats = pack_context([first, same_id, same_text, chunk(text(20, 100))], 10000)
+    assert stats["packed"] == 2 and stats["duplicates"] == 2
+    assert "[2]" in context and "[3]" not in context
+
+
+def test_overlap_between_neighbouring_chunks_is_sent_once():
+    shared = text(10, 500)
+    earlier = chunk(f"{text(15)} {shared}", n=0)
+    later = chunk(f"{shared} {text(15, 300)}", n=1)
+    other_section = chunk(f"{shared} {text(15, 700)}", section="Methods", n=1)
+    context, stats = pack_context([later, earlier, other_section], 10000)
+    assert context.count(shared) == 2
+    assert stats["overlap_chars"] == len(shared)
+    # The later chunk was packed first, so the earlier one gives up its tail.
+    blocks = context.split("\n\n")
+    assert blocks[0].endswith(later.page_content) and blocks[1].endswith(text(15))
+
+
+def test_packing_stops_at_the_token_budget():
+    docs = [chunk(text(60, 100 * i), source=f"{i}.pdf") for i in range(10)]
+    for budget in (200, 250, 300, 1000):
+        context, stats = pack_context(docs, budget)
+        assert stats["context_tokens"] <= budget
+        assert estimate_tokens(context) <= budget
+        assert stats["packed"] + stats["dropped"] == 10
+    context, stats = pack_context(docs, 250)
+    # The second chunk only fits cut short; nothing after it fits at all.
+    assert (stats["packed"], stats["truncated"], stats["dropped"]) == (2, 1, 8)
+    last = context.split("\n\n")[-1].split("\n", 1)[1]
+    assert last.endswith(" …") and estimate_tokens(last) >= MIN_PACKED_TOKENS
@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from langchain_core.embeddings import Embeddings
+from rag.embeddings import CachedEmbeddings
+from rag.fakes import HashEmbeddings
+
+
+class CountingEmbeddings(HashEmbeddings):
+    # Records every text sent upstream, in call order.
+    def __init__(self):
+        super().__init__(size=16)
+        self.sent = []
+
+    def embed_documents(self, texts):
+        self.sent.append(list(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.sent.append([text])
+        return super().embed_query(text)
+
+
+def test_second_embed_documents_is_served_from_cache():
+    upstream = CountingEmbeddings()
+    cached = CachedEmbeddings(upstream, "model-a", ":memory:")
+    texts = ["alpha", "beta", "gamma"]
+    first = cached.embed_documents(texts)
+    calls = upstream.calls
+    second = cached.embed_documents(texts)
+    assert upstream.calls == calls
+    assert second == first
+    assert first == HashEmbeddings(size=16).embed_documents(texts)
+
+
+def test_hit_and_miss_counts():
+    upstream = CountingEmbeddings()
+    cached = CachedEmbeddings(upstream, "model-a", ":memory:")
+    cached.embed_documents(["alpha", "beta", "alpha"])
+    # A repeated text inside one call is embedded once and counted as a hit.
+    assert (cached.misses, cached.hits) == (2, 1)
+    assert upstream.sent == [["alpha", "beta"]]
+    cached.embed_documents(["beta", "delta"])
+    assert (cached.misses, cached.hits) == (3, 2)
+    assert upstream.sent[-1] == ["delta"]
+    stats = cached.stats()
+    assert stats["calls"] == 2
+    assert stats["hit_rate"] == 2 / 5
+
+
+def test_queries_are_cached_apart_from_documents():
+    upstream = CountingEmbeddings()
+    cached = CachedEmbeddings(upstream, "model-a", ":memory:")
+    cached.embed_documents(["alpha"])
+    cached.embed_query("alpha")
+    cached.embed_query("alpha")
+    assert upstream.sent == [["alpha"], ["alpha"]]
+    assert (cached.misses, cached.hits) == (2, 1)
+
+
+def test_batches_over_batch_size():
+    upstream = CountingEmbeddings()
+    cached = CachedEmbeddings(upstream, "model-a", ":memory:", batch_size=4)
+    texts = [f"text {i}" for i in range(10)]
+    assert cached.embed_documents(texts) == HashEmbeddings(size=16).embed_documents(texts)
+    assert sorted(len(batch) for batch in upstream.sent) == [2, 4, 4]
+
+
+def test_model_change_rekeys_entries(tmp_path):
+    path = os.path.join(tmp_path, "cache.sqlite")
+    upstream = CountingEmbeddings()
+    CachedEmbeddings(upstream, "model-a", path).embed_documents(["alpha", "beta"])
+
+    reopened = CachedEmbeddings(upstream, "model-a", path)
+    reopened.embed_documents(["alpha", "beta"])
+    assert (reopened.hits, reopened.misses) == (2, 0)
+
+    # Vectors from another model must never be served for this one.
+    other = CachedEmbeddings(upstream, "model-b", path)
+    other.embed_documents(["alpha", "beta"])
+    assert (other.hits, other.misses) == (0, 2)
+    assert upstream.sent == [["alpha", "beta"], ["alpha", "beta"]]
+
+
+class QueryTaskEmbeddings(Embeddings):
+    # Like GoogleGenerativeAIEmbeddings: no embed_queries, but embed_documents
+    # takes the task type.
+    def __init__(self):
+        self.inner = HashEmbeddings(size=16)
+        self.task_types = []
+        self.fail = False
+
+    def embed_documents(self, texts, task_type=None):
+        self.task_types.append(task_type)
+        if self.fail:
+            raise TypeError("bad input")
+        return [self.inner.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        self.task_types.append("single")
+        return self.inner.embed_query(text)
+
+
+class PlainEmbeddings(QueryTaskEmbeddings):
+    def embed_documents(self, texts):
+        return super().embed_documents(texts)
+
+
+def test_query_batches_use_the_query_task_type_when_supported():
+    upstream = QueryTaskEmbeddings()
+    cached = CachedEmbeddings(upstream, "model-a", ":memory:")
+    assert cached.embed_queries(["alpha", "beta"]) == [upstream.inner.embed_query(t) for t in ("alpha", "beta")]
+    assert upstream.task_types == ["RETRIEVAL_QUERY"]
+
+    plain = PlainEmbeddings()
+    CachedEmbeddings(plain, "model-a", ":memory:").embed_queries(["alpha", "beta"])
+    assert plain.task_types == ["single", "single"]
+
+
+def test_errors_from_the_query_batch_are_not_swallowed():
+    upstream = QueryTaskEmbeddings()
+    upstream.fail = True
+    cached = CachedEmbeddings(upstream, "model-a", ":memory:")
+    with pytest.raises(TypeError):
+        cached.embed_queries(["alpha"])
+    assert "single" not in upstream.task_types
+
+
+def test_counts_are_exact_under_concurrent_lookups():
+    cached = CachedEmbeddings(HashEmbeddings(size=16), "model-a", ":memory:")
+    cached.embed_documents(["alpha"])
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: cached.embed_documents(["alpha"] * 50), range(200)))
+    assert (cached.hits, cached.misses) == (200 * 50, 1)
@@ -0,0 +1,21 @@
+from benchmarks.import_time import app_imports, heavy_imports, importtime
+
+
+def test_app_does_not_import_heavy_backends_before_first_render():
+    extra = app_imports()[0]
+    assert extra
+    assert heavy_imports(extra) == []
+
+
+def test_heavy_backends_are_detected():
+    rows, _ = importtime(["-c", "import json, httpx"])
+    heavy = heavy_imports(rows)
+    assert "httpx" in heavy
+    assert not [name for name in heavy if name.startswith("json")]
+
+
+def test_importtime_rows_carry_module_depth():
+    rows, _ = importtime(["-c", "import json"])
+    by_name = {name: depth for name, _, _, depth in rows}
+    assert by_name["json"] == 0
+    assert by_name["json.decoder"] > 0
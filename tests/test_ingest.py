@@ -0,0 +1,48 @@
+import json
+from langchain_core.documents import Document
+import ingest
+from ingestion import pipeline
+from rag import vector_store
+from rag.fakes import HashEmbeddings
+
+
+def fake_documents(paper):
+    # One chunk per line of the fake "PDF".
+    with open(paper["path"], encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    return [Document(page_content=line, metadata={"source": paper["path"], "section": "Results"}) for line in lines]
+
+
+def write_papers(folder, papers):
+    folder.mkdir(exist_ok=True)
+    for name, lines in papers.items():
+        (folder / name).write_text("\n".join(lines), encoding="utf-8")
+
+
+def ingest_folder(folder, store):
+    return ingest.ingest_directory(str(folder), "numpy", str(store), HashEmbeddings(size=16), workers=1)
+
+
+def test_chunks_of_removed_and_changed_files_leave_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_stores", {})
+    monkeypatch.setattr(pipeline, "get_cached_parse", lambda path: {"path": path, "num_pages": 1})
+    monkeypatch.setattr(pipeline, "get_preview", lambda path: None)
+    monkeypatch.setattr(pipeline, "json_to_documents", fake_documents)
+    papers, store = tmp_path / "papers", tmp_path / "store"
+    write_papers(papers, {"a.pdf": ["alpha one", "alpha two"], "b.pdf": ["beta one"], "c.pdf": ["gamma one"]})
+    ingest_folder(papers, store)
+    vectordb = vector_store._get_store(str(store), backend="numpy")
+    assert len(vectordb) == 4 and len(vector_store.lexical_index(vectordb)) == 4
+
+    (papers / "b.pdf").unlink()
+    write_papers(papers, {"c.pdf": ["gamma one, revised"]})
+    report = ingest_folder(papers, store)
+    assert report["deleted"] == 2
+    with open(store / ingest.MANIFEST_NAME, encoding="utf-8") as f:
+        files = json.load(f)["files"]
+    assert sorted(files) == ["a.pdf", "c.pdf"]
+    live = sorted(i for entry in files.values() for i in entry["chunk_ids"])
+    assert sorted(vectordb.get()["ids"]) == live
+    index = vector_store.lexical_index(vectordb)
+    assert len(index) == 3
+    assert [doc.page_content for doc, _ in index.search("beta", k=3)] == []
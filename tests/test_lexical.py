@@ -0,0 +1,67 @@
+import json
+import os
+from langchain_core.documents import Document
+from rag import vector_store
+from rag.fakes import HashEmbeddings
+from rag.lexical import BM25Index
+from rag.vector_store import LEXICAL_INDEX_FILE, create_or_load_vectorstore, lexical_index
+
+TEXTS = [
+    "Superconducting niobium films pin vortices at grain boundaries.",
+    "Gold capping layers change the vortex pinning landscape.",
+    "Higgs production via vector boson fusion at the LHC.",
+]
+
+
+def documents(prefix=""):
+    return [Document(page_content=prefix + t, metadata={"source": f"p{i}.pdf", "section": "Results"})
+            for i, t in enumerate(TEXTS)]
+
+
+def test_index_is_kept_beside_its_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_stores", {})
+    first = create_or_load_vectorstore(documents(), str(tmp_path / "a"), HashEmbeddings(size=16), "numpy")
+    second = create_or_load_vectorstore(documents("Other: "), str(tmp_path / "b"), HashEmbeddings(size=16), "numpy")
+    assert os.path.exists(tmp_path / "a" / LEXICAL_INDEX_FILE)
+    assert lexical_index(first) is not lexical_index(second)
+    assert len(lexical_index(first)) == 3 and len(lexical_index(second)) == 3
+    [(doc, _)] = lexical_index(first).search("higgs boson", k=1)
+    assert doc.page_content == TEXTS[2]
+    assert doc.metadata["source"] == "p2.pdf"
+
+
+def test_log_holds_no_text_and_is_appended(tmp_path):
+    store = {}
+    path = str(tmp_path / LEXICAL_INDEX_FILE)
+    index = BM25Index(path, fetch=lambda ids: [store.get(i) for i in ids])
+    docs = documents()
+    for i, doc in enumerate(docs):
+        doc.metadata["chunk_id"] = f"c{i}"
+        store[f"c{i}"] = doc
+    index.add_documents(docs[:2])
+    index.add_documents(docs)
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["id"] for line in lines] == ["c0", "c1", "c2"]
+    assert "niobium" in lines[0]["terms"]
+    assert TEXTS[0] not in json.dumps(lines)
+
+    reloaded = BM25Index(path, fetch=lambda ids: [store.get(i) for i in ids])
+    assert [d.metadata["chunk_id"] for d, _ in reloaded.search("vortex pinning niobium", k=2)] == ["c1", "c0"]
+    assert [d.metadata["chunk_id"] for d, _ in reloaded.search("niobium pinning", filter={"source": "p0.pdf"})] == ["c0"]
+
+
+def test_delete_and_torn_log(tmp_path):
+    path = str(tmp_path / LEXICAL_INDEX_FILE)
+    index = BM25Index(path)
+    docs = documents()
+    for i, doc in enumerate(docs):
+        doc.metadata["chunk_id"] = f"c{i}"
+    index.add_documents(docs)
+    assert index.delete(["c0", "missing"]) == 1
+    assert [d.page_content for d, _ in index.search("vortex pinning niobium")] == [TEXTS[1]]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "c9", "meta')
+    reloaded = BM25Index(path, fetch=lambda ids: [Document(page_content=i) for i in ids])
+    assert len(reloaded) == 2
+    assert [d.page_content for d, _ in reloaded.search("higgs")] == ["c2"]
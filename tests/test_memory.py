@@ -0,0 +1,65 @@
+from ingestion.chunker import estimate_tokens
+from rag.fakes import fake_chat_model
+from rag.memory import MAX_TURN_ANSWER_TOKENS, ConversationMemory
+
+
+def answer(i, words=30):
+    return " ".join(f"word{i}-{j}" for j in range(words))
+
+
+def test_window_stays_within_its_token_budget():
+    memory = ConversationMemory(token_budget=200)
+    for i in range(10):
+        memory.add_turn(f"question {i}?", answer(i))
+        assert memory._window_tokens() <= 200
+    assert [q for q, _ in memory.turns] == ["question 8?", "question 9?"]
+    assert memory.summarized_turns == 8
+    # Without an LLM the evicted turns become a transcript clipped from the front.
+    assert memory.summary.startswith("… ") and memory.summary.endswith(answer(7))
+    assert "question 0?" not in memory.history_text()
+    assert estimate_tokens(memory.summary) <= memory.summary_tokens
+
+
+def test_a_long_answer_is_clipped_before_it_enters_the_window():
+    memory = ConversationMemory(token_budget=10000)
+    memory.add_turn("q?", answer(0, words=2000))
+    assert estimate_tokens(memory.turns[0][1]) <= MAX_TURN_ANSWER_TOKENS + 1
+
+
+def test_evicted_turns_are_folded_into_a_rolling_summary():
+    llm = fake_chat_model(["Summary one.", "Summary two."])
+    memory = ConversationMemory(llm, token_budget=60)
+    memory.add_turn("first question?", answer(1, 20))
+    assert memory.summary == "" and llm.i == 0
+    memory.add_turn("second question?", answer(2, 20))
+    assert (memory.summary, memory.summarized_turns, llm.i) == ("Summary one.", 1, 1)
+    memory.add_turn("third question?", answer(3, 20))
+    assert (memory.summary, memory.summarized_turns) == ("Summary two.", 2)
+    history = memory.history_text()
+    assert history.startswith("<conversation>\nSummary of earlier conversation: Summary two.")
+    assert "third question?" in history and "second question?" not in history
+
+
+def test_a_summary_over_its_limit_keeps_the_most_recent_part():
+    llm = fake_chat_model([answer(0, 400)])
+    memory = ConversationMemory(llm, token_budget=60, summary_tokens=50)
+    memory.add_turn("first?", answer(1, 20))
+    memory.add_turn("second?", answer(2, 20))
+    assert memory.summary.startswith("… ") and memory.summary.endswith(answer(0, 400)[-20:])
+    assert estimate_tokens(memory.summary) <= 51
+
+
+def test_condensed_question_is_cached_until_the_history_changes():
+    llm = fake_chat_model(["What are the limits of vortex pinning?", "Another rewrite"])
+    memory = ConversationMemory(llm)
+    # Nothing to resolve against yet, so no LLM call.
+    assert memory.condense("what about its limits?") == "what about its limits?" and llm.i == 0
+    memory.add_turn("How does vortex pinning work?", "Defects trap vortices.")
+    assert memory.condense("what about its limits?") == "What are the limits of vortex pinning?"
+    assert memory.chain_input("what about its limits?")["query"] == "What are the limits of vortex pinning?"
+    assert llm.i == 1
+    memory.add_turn("what about its limits?", "Thermal creep.")
+    assert memory.condense("what about its limits?") == "Another rewrite"
+    memory.clear()
+    assert memory.condense("and then?") == "and then?"
+    assert memory.history_text() == "" and memory.stats()["turns"] == 0
@@ -0,0 +1,113 @@
+import os
+import threading
+import numpy as np
+from rag import numpy_store
+from rag.fakes import HashEmbeddings
+from rag.numpy_store import DOCS_FILE, VECTORS_FILE, NumpyVectorStore
+
+
+def texts(n, prefix="chunk"):
+    return [f"{prefix} {i}" for i in range(n)]
+
+
+def test_repeated_ids_in_one_call_keep_the_last_text():
+    embedding = HashEmbeddings(size=8)
+    store = NumpyVectorStore(embedding)
+    store.add_texts(["a", "b", "c"], [{"n": 1}, {"n": 2}, {"n": 3}], ids=["x", "y", "x"])
+    assert len(store) == 2
+    assert embedding.texts_embedded == 2
+    got = store.get(ids=["x", "y"])
+    assert got["documents"] == ["c", "b"]
+    assert got["metadatas"] == [{"n": 3}, {"n": 2}]
+    assert store.similarity_search("c", k=1)[0].id == "x"
+
+
+def test_appends_grow_the_buffer_without_copying_every_call():
+    store = NumpyVectorStore(HashEmbeddings(size=8))
+    buffers = set()
+    for i in range(50):
+        store.add_texts(texts(40, f"batch {i}"), ids=[f"{i}-{j}" for j in range(40)])
+        buffers.add(id(store._buffer))
+    assert len(store) == 2000
+    assert len(buffers) <= 3
+    assert store._matrix.shape == (2000, 8)
+    assert np.allclose(np.linalg.norm(store._matrix, axis=1), 1.0)
+
+
+def test_reload_after_appends_overwrites_and_delete(tmp_path):
+    path = str(tmp_path)
+    store = NumpyVectorStore(HashEmbeddings(size=8), persist_directory=path)
+    store.add_texts(texts(5), ids=[str(i) for i in range(5)])
+    store.add_texts(["new 1", "replaced 2"], [{"v": 1}, {"v": 2}], ids=["5", "2"])
+    with open(os.path.join(path, DOCS_FILE), encoding="utf-8") as f:
+        assert len(f.readlines()) == 7
+
+    reloaded = NumpyVectorStore(HashEmbeddings(size=8), persist_directory=path)
+    assert reloaded.get()["ids"] == ["0", "1", "2", "3", "4", "5"]
+    assert reloaded.get(ids=["2"])["documents"] == ["replaced 2"]
+    assert np.array_equal(reloaded.get(include=["embeddings"])["embeddings"], store._matrix)
+    assert reloaded.similarity_search("replaced 2", k=1)[0].id == "2"
+
+    # The first write after loading copies the mapped file into memory.
+    reloaded.add_texts(["more"], ids=["6"])
+    reloaded.delete(["0", "3"])
+    again = NumpyVectorStore(HashEmbeddings(size=8), persist_directory=path)
+    assert again.get()["ids"] == ["1", "2", "4", "5", "6"]
+    assert os.path.getsize(os.path.join(path, VECTORS_FILE)) == 5 * 8 * 4
+    with open(os.path.join(path, DOCS_FILE), encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+
+
+def test_overwrites_compact_the_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(numpy_store, "COMPACT_RATIO", 2)
+    store = NumpyVectorStore(HashEmbeddings(size=8), persist_directory=str(tmp_path))
+    for _ in range(5):
+        store.add_texts(texts(10), ids=[str(i) for i in range(10)])
+    with open(os.path.join(tmp_path, DOCS_FILE), encoding="utf-8") as f:
+        assert len(f.readlines()) <= 20
+
+
+def test_interrupted_write_is_cut_back_to_the_last_whole_row(tmp_path):
+    path = str(tmp_path)
+    store = NumpyVectorStore(HashEmbeddings(size=8), persist_directory=path)
+    store.add_texts(texts(3), ids=["a", "b", "c"])
+    with open(os.path.join(path, VECTORS_FILE), "ab") as f:
+        f.write(np.ones(8, np.float32).tobytes())
+    with open(os.path.join(path, DOCS_FILE), "a", encoding="utf-8") as f:
+        f.write('[3, "d", "chu')
+    reloaded = NumpyVectorStore(HashEmbeddings(size=8), persist_directory=path)
+    assert reloaded.get()["ids"] == ["a", "b", "c"]
+    reloaded.add_texts(["chunk 3"], ids=["d"])
+    assert NumpyVectorStore(HashEmbeddings(size=8), persist_directory=path).get()["ids"] == ["a", "b", "c", "d"]
+
+
+def test_searches_during_adds_see_consistent_rows():
+    embedding = HashEmbeddings(size=16)
+    store = NumpyVectorStore(embedding)
+    store.add_texts(texts(5000), ids=[f"seed {i}" for i in range(5000)])
+    query = embedding.embed_query("chunk 1")
+    # Rows the writer is about to add, so readers look them up mid-add.
+    scope = {"chunk_id": {"$in": [f"{i}-{j}" for i in range(200) for j in range(3)]}}
+    errors = []
+    done = threading.Event()
+
+    def search():
+        while not done.is_set():
+            try:
+                docs, matrix = store.candidates_by_vector(query, 20, scope)
+                assert len(docs) == len(matrix)
+                store.candidates_by_vectors([query, query], 5, scope)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for i in range(200):
+        store.add_texts(texts(3, f"add {i}"), ids=[f"{i}-{j}" for j in range(3)])
+    done.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+    assert len(store) == 5600
@@ -0,0 +1,85 @@
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from langchain_core.documents import Document
+from ingestion import parallel, pipeline
+
+
+def fake_parse(path, page_workers=1):
+    # Runs in the spawned workers, which import it from this module.
+    name = os.path.basename(path)
+    if name == "crash":
+        os._exit(1)
+    if name == "hang":
+        time.sleep(60)
+    if name == "slow":
+        time.sleep(1)
+    if name == "boom":
+        raise ValueError("not a PDF")
+    return {"title": name, "sections": [], "num_pages": 1, "page_workers": page_workers}
+
+
+def parse_all(monkeypatch, paths, **kwargs):
+    monkeypatch.setattr(parallel, "parse_pdf_to_json", fake_parse)
+    monkeypatch.setattr(parallel, "get_cached_parse", lambda path: None)
+    results = {}
+    for path, paper, error in parallel.parse_pdfs(paths, **kwargs):
+        results.setdefault(path, []).append(paper["title"] if paper else type(error).__name__)
+    return results
+
+
+def test_a_crashed_worker_fails_only_its_own_file(monkeypatch):
+    results = parse_all(monkeypatch, ["a", "b", "crash", "c", "boom", "d"], max_workers=2)
+    assert results == {
+        "a": ["a"], "b": ["b"], "c": ["c"], "d": ["d"], "crash": ["BrokenProcessPool"], "boom": ["ValueError"],
+    }
+
+
+def test_a_wedged_worker_is_replaced(monkeypatch):
+    start = time.monotonic()
+    results = parse_all(monkeypatch, ["hang", "a", "b", "c"], max_workers=2, timeout=5)
+    assert results == {"hang": ["TimeoutError"], "a": ["a"], "b": ["b"], "c": ["c"]}
+    assert time.monotonic() - start < 30
+
+
+def test_time_queued_behind_other_files_is_not_timed(monkeypatch):
+    # Four one-second parses on one worker take four seconds in all.
+    results = parse_all(monkeypatch, [f"{i}/slow" for i in range(4)], max_workers=1, timeout=3)
+    assert all(outcome == ["slow"] for outcome in results.values())
+
+
+def test_a_lone_file_gets_the_spare_cores_as_page_workers(monkeypatch):
+    monkeypatch.setattr(parallel, "parse_pdf_to_json", fake_parse)
+    monkeypatch.setattr(parallel, "get_cached_parse", lambda path: None)
+    [(_, paper, error)] = parallel.parse_pdfs(["a"], max_workers=3)
+    assert error is None and paper["page_workers"] == 3
+
+
+def test_pipeline_survives_a_worker_crash(monkeypatch):
+    monkeypatch.setattr(pipeline, "parse_pdf_to_json", fake_parse)
+    monkeypatch.setattr(pipeline, "get_cached_parse", lambda path: None)
+    monkeypatch.setattr(pipeline, "get_preview", lambda path: None)
+    monkeypatch.setattr(pipeline, "json_to_documents", lambda paper: [Document(page_content=paper["title"])])
+    indexed = []
+    report = pipeline.run_pipeline(
+        paths=["a", "b", "crash", "c", "d", "e"], parse_workers=2, index=indexed.extend
+    )
+    assert sorted(report["indexed"]) == ["a", "b", "c", "d", "e"]
+    assert sorted(doc.page_content for doc in indexed) == ["a", "b", "c", "d", "e"]
+    parse_stage = next(s for s in report["stages"] if s["stage"] == "parse")
+    assert parse_stage["errors"] == 1
+
+
+def test_run_raises_the_crash_for_the_file_that_causes_it():
+    pool = parallel.ParsePool(2)
+    try:
+        assert pool.run(fake_parse, "a")["title"] == "a"
+        try:
+            pool.run(fake_parse, "crash")
+        except BrokenProcessPool:
+            pass
+        else:
+            raise AssertionError("expected BrokenProcessPool")
+        assert pool.run(fake_parse, "b")["title"] == "b"
+    finally:
+        pool.close()
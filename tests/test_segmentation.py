@@ -0,0 +1,65 @@
+import time
+from ingestion.extractor import PREAMBLE_TITLE, join_pages, split_by_headings
+
+BODY = "Vortex pinning in thin niobium films was measured at low temperature."
+
+
+def titles(text, *args):
+    return [s["section_title"] for s in split_by_headings(text, *args)]
+
+
+def test_numbered_and_caps_headings():
+    text = f"1 Introduction\n{BODY}\n2\nMethods\n{BODY}\nRESULTS\n{BODY}\n"
+    sections = split_by_headings(text)
+    assert [s["section_title"] for s in sections] == ["1 Introduction", "2 Methods", "RESULTS"]
+    assert all(s["content"] == BODY for s in sections)
+
+
+def test_text_before_the_first_heading_is_the_preamble():
+    sections = split_by_headings(f"A Study of Vortices\n{BODY}\n1 Introduction\n{BODY}")
+    assert [s["section_title"] for s in sections] == [PREAMBLE_TITLE, "1 Introduction"]
+    assert sections[0]["content"] == f"A Study of Vortices\n{BODY}"
+    assert titles(f"1 Introduction\n{BODY}") == ["1 Introduction"]
+    assert titles(BODY) == [PREAMBLE_TITLE]
+    assert titles("") == []
+
+
+def test_captions_and_acronyms_do_not_split():
+    text = (f"1 Introduction\n{BODY}\nFIGURE 3\n{BODY}\nTABLE 1 RESULTS OF THE FIT\n{BODY}\n"
+            f"Fig. 2 Critical current versus field\n{BODY}\nTable 4 Sample parameters\n{BODY}\n"
+            f"NASA\n{BODY}\n")
+    sections = split_by_headings(text)
+    assert [s["section_title"] for s in sections] == ["1 Introduction"]
+    assert "FIGURE 3" in sections[0]["content"] and "NASA" in sections[0]["content"]
+
+
+def test_pages_of_each_section():
+    pages = [(1, f"Title\n{BODY}"), (2, f"1 Introduction\n{BODY}\n{BODY}"), (3, f"{BODY}\n2 Results\n{BODY}")]
+    text, page_starts = join_pages(pages)
+    sections = split_by_headings(text, page_starts)
+    assert [(s["section_title"], s["page"], s["page_end"]) for s in sections] == [
+        (PREAMBLE_TITLE, 1, 1), ("1 Introduction", 2, 3), ("2 Results", 3, 3)]
+    sections = split_by_headings(text, page_starts, [10, 11, 12])
+    assert [(s["page"], s["page_end"]) for s in sections] == [(10, 10), (11, 12), (12, 12)]
+
+
+def test_table_rows_are_not_sections():
+    rows = "\n".join(f"ROW {i} ALPHA BETA\n0.{i} 1.{i}" for i in range(50))
+    sections = split_by_headings(f"1 Introduction\n{BODY}\n{rows}\n2 Results\n{BODY}")
+    assert [s["section_title"] for s in sections] == ["1 Introduction", "2 Results"]
+    assert "ROW 49 ALPHA BETA" in sections[0]["content"]
+
+
+def test_pathological_inputs_are_fast_and_few_sections():
+    inputs = [
+        "\n".join(f"ROW {i} ALPHA BETA" for i in range(100000)),
+        "\n".join(f"ROW {i} ALPHA BETA\n0.{i} 1.{i}" for i in range(100000)),
+        "\n" + "ABC DEF 123 GHI\n" * 100000,
+        "\n" + "A " * 400000,
+        "\n" + "1 Introduction\n" * 100000,
+    ]
+    for text in inputs:
+        start = time.perf_counter()
+        sections = split_by_headings(text)
+        assert time.perf_counter() - start < 2
+        assert len(sections) <= 2
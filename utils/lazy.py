@@ -0,0 +1,35 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    # Stands in for a module until the first attribute access imports it.
+    # importlib's per-module locks make a first use racing warm_up() safe.
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def warm_up(*modules):
+    # Imports modules on a daemon thread so the first real use finds them in
+    # sys.modules, without holding up the render that scheduled it.
+    def load():
+        for module in modules:
+            try:
+                importlib.import_module(module._name if isinstance(module, LazyModule) else module)
+            except Exception as e:
+                print("Warm-up import failed:", e)
+
+    thread = threading.Thread(target=load, name="warm-up", daemon=True)
+    thread.start()
+    return thread
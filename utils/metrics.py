@@ -0,0 +1,231 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+
+# Spans, counters and histograms for finding where a slow question or ingest
+# spent its time (PDF parsing, heading detection, embedding calls, store
+# inserts, retrieval, generation). Off unless METRICS=1 or enable() is
+# called; while off, span() hands back one shared no-op object and the other
+# calls return straight away.
+ENABLED = os.getenv("METRICS", "0") == "1"
+# Histogram bucket upper bounds in seconds.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_TRACES = 20
+# Per span, so a loop of short spans cannot grow a trace without bound.
+MAX_CHILDREN = 200
+PROMETHEUS_PREFIX = "paperbot"
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_traces = deque(maxlen=MAX_TRACES)
+_current = contextvars.ContextVar("metrics_span", default=None)
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation.
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], self.counts)),
+        }
+
+
+class Span:
+    # Times a block, records the duration in the histogram of the same name
+    # and hangs itself under the enclosing span. Spans with no parent are
+    # kept as the most recent traces. Nesting follows contextvars, so it
+    # carries into asyncio tasks and LangChain's worker threads but not into
+    # a plain thread or process pool.
+    __slots__ = ("name", "attrs", "start", "duration", "children", "_parent", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+        self.children = []
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._parent = _current.get()
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned generator.
+            _current.set(self._parent)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        observe(self.name, self.duration)
+        if self._parent is None:
+            _traces.append(self)
+        elif len(self._parent.children) < MAX_CHILDREN:
+            self._parent.children.append(self)
+        return False
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "ms": round((self.duration or 0.0) * 1000, 3),
+            "attrs": self.attrs,
+            "children": [c.as_dict() for c in sorted(self.children, key=lambda c: c.start)],
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **attrs):
+    if not ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name):
+    # Decorator form of span() for whole functions.
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def increment(name, value=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _traces.clear()
+
+
+def recent_traces():
+    # Newest first.
+    return [trace.as_dict() for trace in reversed(_traces)]
+
+
+def snapshot():
+    with _lock:
+        return {
+            "enabled": ENABLED,
+            "counters": dict(_counters),
+            "histograms": {name: h.as_dict() for name, h in _histograms.items()},
+            "traces": recent_traces(),
+        }
+
+
+def to_json(indent=2):
+    return json.dumps(snapshot(), indent=indent, default=str)
+
+
+def _metric_name(name, suffix):
+    return f"{PROMETHEUS_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_{suffix}"
+
+
+def prometheus_text():
+    # Text exposition format: counters as <name>_total, span and other
+    # timings as <name>_seconds histograms with cumulative buckets.
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((name, h.counts[:], h.count, h.sum) for name, h in _histograms.items())
+    for name, value in counters:
+        metric = _metric_name(name, "total")
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    for name, counts, count, total in histograms:
+        metric = _metric_name(name, "seconds")
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, bucket in zip([*map(str, BUCKETS), "+Inf"], counts):
+            cumulative += bucket
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"{metric}_sum {total}", f"{metric}_count {count}"]
+    return "\n".join(lines) + "\n"
+
+
+def format_trace(trace, depth=0):
+    # Indented "name  12.3 ms  key=value" lines for a trace from recent_traces().
+    attrs = " ".join(f"{k}={v}" for k, v in trace["attrs"].items())
+    lines = [f"{'  ' * depth}{trace['name']}  {trace['ms']:.1f} ms" + (f"  {attrs}" if attrs else "")]
+    for child in trace["children"]:
+        lines.extend(format_trace(child, depth + 1))
+    return lines
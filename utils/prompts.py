@@ -1,31 +1,65 @@
+from functools import lru_cache
 from langchain_core.prompts import PromptTemplate
 
+PERSONA_INSTRUCTIONS = {
+    "professor": (
+        "You are a senior researcher (professor) answering questions about scientific papers. "
+        "Provide a detailed, technical, and structured answer. Use numbered points or sections if relevant. "
+        "Explain advanced concepts clearly, and include references to the context when possible."
+    ),
+    "student": (
+        "You are a student trying to understand the main idea and method of a scientific paper. "
+        "Answer in a simple, step-by-step, and easy-to-understand way. Use numbered lists or bullet points. "
+        "Focus on the main idea, method, and key results. Avoid jargon."
+    ),
+    "default": (
+        "You are a helpful AI assistant answering questions about scientific papers. "
+        "Be concise, clear, and informative. Use numbers or bullet points if it helps clarity."
+    ),
+}
+
+# Token budget for the packed <context> block. The professor gets room for
+# detail; the student answer should stay focused on fewer chunks.
+CONTEXT_TOKEN_BUDGETS = {
+    "professor": 2400,
+    "student": 1200,
+    "default": 1600,
+}
+
+
+def get_context_budget(persona="default"):
+    return CONTEXT_TOKEN_BUDGETS.get(persona, CONTEXT_TOKEN_BUDGETS["default"])
+
+# Templates are built once per persona and shared; PromptTemplate is not
+# mutated by formatting.
+@lru_cache(maxsize=None)
 def get_persona_prompt(persona="default"):
-    if persona == "professor":
-        system_instruction = (
-            "You are a senior researcher (professor) answering questions about scientific papers. "
-            "Provide a detailed, technical, and structured answer. Use numbered points or sections if relevant. "
-            "Explain advanced concepts clearly, and include references to the context when possible."
-        )
-    elif persona == "student":
-        system_instruction = (
-            "You are a student trying to understand the main idea and method of a scientific paper. "
-            "Answer in a simple, step-by-step, and easy-to-understand way. Use numbered lists or bullet points. "
-            "Focus on the main idea, method, and key results. Avoid jargon."
-        )
-    else:
-        system_instruction = (
-            "You are a helpful AI assistant answering questions about scientific papers. "
-            "Be concise, clear, and informative. Use numbers or bullet points if it helps clarity."
-        )
+    system_instruction = PERSONA_INSTRUCTIONS.get(persona, PERSONA_INSTRUCTIONS["default"])
 
     return PromptTemplate.from_template(f"""
 {system_instruction}
 
-<context>
+{{history}}<context>
 {{context}}
 </context>
 
 Question: {{input}}
 Answer:
 """)
+
+
+# Used by rag.memory: one turns a follow-up into a standalone retrieval query,
+# the other folds evicted turns into the rolling summary.
+CONDENSE_QUESTION_PROMPT = """Given the conversation below and a follow-up question, rewrite the follow-up as a standalone question that can be understood without the conversation. Keep technical terms, names and formulas exactly as written. Reply with the question only.
+
+{history}Follow-up question: {question}
+Standalone question:"""
+
+SUMMARIZE_HISTORY_PROMPT = """Progressively summarize a conversation about scientific papers. Extend the current summary with the new lines, keeping the papers, topics and conclusions discussed. Use at most {max_words} words.
+
+Current summary: {summary}
+
+New lines:
+{new_lines}
+
+New summary:"""